@@ -3,6 +3,7 @@ from authlib.integrations.starlette_client import OAuth
 from starlette.responses import RedirectResponse
 import os
 from dotenv import load_dotenv
+from app.core.tenancy import set_tenant, tenant_for_user, evict_idle_tenants
 
 load_dotenv()
 
@@ -62,6 +63,16 @@ async def get_current_user(request: Request):
         return user
     raise HTTPException(status_code=401, detail="Not authenticated")
 
+async def bind_tenant(request: Request):
+    """
+    Dependency for the data API: runs the request against the signed-in user's
+    own store, caches, notifications and ingestion queue (anonymous requests
+    share the default tenant).
+    """
+    set_tenant(tenant_for_user(request.session.get("user")))
+    # Free the memory of tenants that have gone quiet
+    evict_idle_tenants()
+
 @router.get("/logout")
 async def logout(request: Request):
     request.session.clear()
@@ -1,22 +1,45 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import pandas as pd
-import io
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, FileResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
+import os
+import tempfile
 from pydantic import BaseModel
 from app.models.schemas import (
     ForecastRequest, ForecastResult, 
     InventoryRequest, InventoryPlan, 
-    SalesDataPoint
+    WhatIfRequest, WhatIfResult,
+    SalesDataPoint, MAX_LEAD_TIME
 )
 from app.services.forecasting import generate_forecast
-from app.services.inventory import calculate_inventory_metrics
+from app.services.inventory import (
+    calculate_inventory_metrics, get_reorder_table, get_inventory_plan_table, plans_from_table
+)
+from app.services.simulation import run_what_if
+from app.services.forecasting import get_product_forecasts
+from app.services.export import (
+    iter_forecast_batches, iter_plan_batches, write_export,
+    EXPORT_FORMATS, PARQUET_SUPPORT
+)
+from app.services.stock_alerts import get_stock_risk_count
+from app.services.chat_context import get_chat_context
+from app.services.ingestion import (
+    start_ingestion, get_ingestion_status, clear_dataset, rollback_dataset, EXCEL_SUPPORT, UPLOAD_CHUNK_BYTES,
+    MAX_UPLOAD_BYTES
+)
+from app.core.versions import list_versions
 
 from app.core.database import (
     insert_sales_data, get_all_sales_data, clear_sales_data, get_recent_sales_data,
-    add_notification, get_notifications, get_archived_history, mark_notifications_read, clear_notifications
+    add_notification, get_notifications, get_archived_history, mark_notifications_read, clear_notifications,
+    wait_for_notifications, get_data_version
 )
 
-router = APIRouter()
+from app.api.auth import bind_tenant
+from app.api.throttling import rate_limit, run_heavy, run_admitted
+
+# Every data endpoint runs as the caller's tenant
+router = APIRouter(dependencies=[Depends(bind_tenant)])
 
 @router.get("/history")
 async def get_history_endpoint():
@@ -32,7 +55,8 @@ async def get_history_endpoint():
 @router.post("/clear-data", response_model=dict)
 async def clear_data_endpoint():
     try:
-        result = clear_sales_data()
+        # Recorded as an (empty) dataset version, so it can be rolled back
+        summary = clear_dataset()
         
         # Add success notification
         add_notification(
@@ -41,159 +65,82 @@ async def clear_data_endpoint():
             type="info"
         )
         
-        return result
+        return {"status": "success", "version": summary["version"]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/versions")
+async def get_versions_endpoint():
+    """Dataset versions (one per upload that changed the data), newest first."""
+    return list_versions()
+
+@router.post("/versions/{version_id}/rollback")
+async def rollback_endpoint(version_id: str):
+    try:
+        summary = rollback_dataset(version_id)
+        return {"status": "success", "version": summary["version"],
+                "changed_products": len(summary["changed_products"])}
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/upload", response_model=dict)
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), sheets: Optional[str] = None):
     if not (file.filename.endswith('.csv') or file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV or Excel file.")
+    ext = file.filename.rsplit('.', 1)[-1]
+    if ext in EXCEL_SUPPORT and not EXCEL_SUPPORT[ext]:
+        raise HTTPException(status_code=415, detail=f".{ext} uploads are not supported by this server.")
     
-    try:
-        # Decode with sig to handle BOM if CSV, else read bytes for Excel
-        contents = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8-sig')))
-        else:
-            try:
-                import openpyxl
-            except ImportError:
-                # Force install if missing (desperate measure for persistent error)
-                import subprocess, sys
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "openpyxl"])
-                import openpyxl
-                
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        # Normalize columns (strip whitespace, lowercase)
-        df.columns = df.columns.str.strip().str.lower()
-        
-        # Robust Column Mapping
-        # target_col: [list of potential aliases]
-        column_mapping = {
-            'date': ['date', 'time', 'period', 'day', 'txn_date', 'transaction_date'],
-            'product': ['product', 'item', 'sku', 'product_name', 'model', 'name'],
-            'region': ['region', 'location', 'area', 'zone', 'city', 'state', 'country', 'store'],
-            'units_sold': ['units_sold', 'units', 'sold', 'sales', 'quantity', 'qty', 'demand', 'volume'],
-            'price': ['price', 'selling_price', 'unit_price', 'cost', 'amount', 'revenue', 'value'],
-            'inventory': ['inventory', 'stock', 'stock_level', 'on_hand', 'qty_on_hand']
-        }
-        
-        # Helper to find best match
-        def find_col(df_cols, targets):
-            for target in targets:
-                for col in df_cols:
-                    if target in col: # Loose containment match
-                        return col
-            return None
-
-        # internal_name: matched_df_column
-        final_cols = {}
-        for target, aliases in column_mapping.items():
-            match = find_col(df.columns, aliases)
-            if match:
-                final_cols[target] = match
-        
-        # Processing rows with robust defaults
-        records = []
-        today_str = pd.Timestamp.now().strftime('%Y-%m-%d')
-        
-        for _, row in df.iterrows():
-            # Date
-            date_col = final_cols.get('date')
-            try:
-                date_val = pd.to_datetime(row[date_col]).strftime('%Y-%m-%d') if date_col and pd.notna(row[date_col]) else today_str
-            except:
-                date_val = str(row[date_col]).strip() if date_col and pd.notna(row[date_col]) else today_str
-            
-            # Product
-            prod_col = final_cols.get('product')
-            prod_val = str(row[prod_col]).strip() if prod_col and pd.notna(row[prod_col]) else "Unknown Product"
-            if prod_val == '' or prod_val.lower() == 'nan': prod_val = "Unknown Product"
-
-            # Region
-            reg_col = final_cols.get('region')
-            reg_val = str(row[reg_col]).strip() if reg_col and pd.notna(row[reg_col]) else "Unknown Region"
-            if reg_val == '' or reg_val.lower() == 'nan': reg_val = "Unknown Region"
-
-            # Units Sold
-            units_col = final_cols.get('units_sold')
-            try:
-                units_val = float(row[units_col]) if units_col and pd.notna(row[units_col]) else 0.0
-            except:
-                units_val = 0.0
+    # Excel: comma-separated sheet names, or "*" for every sheet (default: first sheet)
+    sheet_names = [name.strip() for name in sheets.split(',')] if sheets else None
 
-            # Price
-            price_col = final_cols.get('price')
-            try:
-                price_val = float(row[price_col]) if price_col and pd.notna(row[price_col]) else 0.0
-            except:
-                price_val = 0.0
+    # Spill the body to disk in fixed-size chunks; parsing happens in the background
+    spill = tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}")
+    received = 0
+    try:
+        with spill:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413,
+                                        detail=f"File is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+                spill.write(chunk)
+    except HTTPException:
+        os.remove(spill.name)
+        raise
+    except Exception as e:
+        os.remove(spill.name)
+        raise HTTPException(status_code=500, detail=f"Error receiving file: {str(e)}")
 
-            # Inventory
-            inv_col = final_cols.get('inventory')
-            try:
-                inv_val = float(row[inv_col]) if inv_col and pd.notna(row[inv_col]) else 0.0
-            except:
-                inv_val = 0.0
-
-            records.append({
-                "date": date_val,
-                "product": prod_val,
-                "region": reg_val,
-                "units_sold": units_val,
-                "price": price_val,
-                "inventory": inv_val
-            })
-        
-        # Clear old data (optional strategy: clean slate on upload)
-        try:
-            clear_sales_data()
-        except:
-            pass # Ignore if clear fails (e.g. first run)
-
-        # Insert into Supabase
-        insert_sales_data(records)
-        
-        # Add Notification
-        total_rev = sum(d['price'] * d['units_sold'] for d in records)
-        count = len(records)
-        add_notification(
-            title="Data Upload Success", 
-            message=f"Successfully uploaded {count} records. Total revenue processed: ₹{total_rev:,.0f}.",
-            type="success"
-        )
+    ingestion_id = start_ingestion(spill.name, file.filename, sheet_names)
+    return JSONResponse(status_code=202, content={
+        "message": "Upload received. Processing in the background.",
+        "ingestion_id": ingestion_id,
+        "status_url": f"/api/upload/{ingestion_id}"
+    })
 
-        # Check for inventory alerts immediately
-        low_stock = [r['product'] for r in records if r['inventory'] < 50]
-        if low_stock:
-            limited_list = ", ".join(low_stock[:3])
-            more_count = len(low_stock) - 3
-            msg = f"Critical stock levels for: {limited_list}"
-            if more_count > 0:
-                msg += f" and {more_count} others."
-            add_notification(
-                title="Inventory Alert", 
-                message=msg,
-                type="warning"
-            )
-            
-        return {"message": "Data uploaded and saved to database successfully"}
-        
-    except Exception as e:
-        import traceback
-        error_msg = f"UPLOAD ERROR: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        with open("backend_errors.log", "a") as f:
-            f.write(error_msg + "\n----------------\n")
-            
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+@router.get("/upload/{ingestion_id}")
+async def get_upload_status(ingestion_id: str):
+    status = get_ingestion_status(ingestion_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion id")
+    return status
 
 @router.get("/notifications")
 async def get_notifications_endpoint():
     return get_notifications()
 
+@router.get("/notifications/poll")
+async def poll_notifications_endpoint(since: int = -1, timeout: float = 25.0):
+    """
+    Long-poll: holds the request until the notification list changes (seq moves
+    past `since`) or `timeout` seconds pass. Pass back the returned seq next time.
+    """
+    seq = await wait_for_notifications(since, min(max(timeout, 0.0), 60.0))
+    return {"seq": seq, "notifications": get_notifications()}
+
 @router.post("/notifications/read")
 async def mark_read_endpoint():
     mark_notifications_read()
@@ -204,62 +151,158 @@ async def clear_notifications_endpoint():
     clear_notifications()
     return {"status": "success"}
 
-@router.post("/forecast", response_model=ForecastResult)
+def _forecast(request: ForecastRequest) -> ForecastResult:
+    # Always prefer DB data for now as frontend might send empty list
+    if not request.data:
+        data_dicts = get_all_sales_data()
+        if not data_dicts:
+            # If no data, return empty result or specific error that frontend can handle
+            # Returning empty result prevents 500
+            return ForecastResult(ds=[], yhat=[], yhat_lower=[], yhat_upper=[], trend=[])
+        
+        # Convert to Pydantic models
+        request.data = [SalesDataPoint(**record) for record in data_dicts]
+    
+    return generate_forecast(request)
+
+@router.post("/forecast", response_model=ForecastResult, dependencies=[Depends(rate_limit)])
 async def get_forecast(request: ForecastRequest):
     try:
-        # Always prefer DB data for now as frontend might send empty list
-        if not request.data:
-            data_dicts = get_all_sales_data()
-            if not data_dicts:
-                # If no data, return empty result or specific error that frontend can handle
-                # Returning empty result prevents 500
-                return ForecastResult(ds=[], yhat=[], yhat_lower=[], yhat_upper=[], trend=[])
-            
-            # Convert to Pydantic models
-            request.data = [SalesDataPoint(**record) for record in data_dicts]
-        
-        return generate_forecast(request)
+        # Identical concurrent requests share one computation
+        return await run_heavy(("forecast", request.model_dump_json()), lambda: _forecast(request))
+    except HTTPException:
+        raise
     except ValueError as ve:
         # Handle specific business logic errors (e.g. not enough data) as 400
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/inventory", response_model=List[InventoryPlan])
+def _inventory_plan(request: InventoryRequest) -> List[InventoryPlan]:
+    if not request.data:
+        # Stored data: a lookup into the plan cached with the product forecasts
+        table = get_inventory_plan_table(request.lead_time, request.service_level,
+                                         request.holding_cost, request.order_cost)
+        return plans_from_table(table)
+        
+    return calculate_inventory_metrics(request)
+
+@router.post("/inventory", response_model=List[InventoryPlan], dependencies=[Depends(rate_limit)])
 async def get_inventory_plan(request: InventoryRequest):
     try:
-        if not request.data:
-            data_dicts = get_all_sales_data()
-            if not data_dicts:
-                return []
-            request.data = [SalesDataPoint(**record) for record in data_dicts]
-            
-        return calculate_inventory_metrics(request)
+        return await run_heavy(("inventory", request.model_dump_json()), lambda: _inventory_plan(request))
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/inventory/simulate", response_model=List[WhatIfResult], dependencies=[Depends(rate_limit)])
+async def simulate_inventory_policies(request: WhatIfRequest):
+    """What-if: simulate (s, Q) policies for a service level / lead times / costs."""
+    try:
+        return await run_heavy(("simulate", request.model_dump_json()), lambda: run_what_if(request))
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _check_export_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    if fmt == "parquet" and not PARQUET_SUPPORT:
+        raise HTTPException(status_code=415, detail="Parquet export is not supported by this server.")
+
+async def _export_response(batches, fmt: str, compression: Optional[str], basename: str):
+    """Spools the export to a temp file under admission control, then serves the file."""
+    if fmt == "parquet":
+        suffix, media_type = ".parquet", "application/vnd.apache.parquet"
+    elif (compression or "gzip") != "none":
+        suffix, media_type = ".csv.gz", "application/gzip"
+    else:
+        suffix, media_type = ".csv", "text/csv"
+    spill = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    spill.close()
+    try:
+        # Encoding is CPU-bound for large catalogs, so it is admitted like any
+        # heavy work instead of running unbounded in the response threadpool
+        await run_admitted(lambda: write_export(batches, fmt, spill.name, compression))
+    except Exception:
+        os.remove(spill.name)
+        raise
+    return FileResponse(spill.name, media_type=media_type, filename=f"{basename}{suffix}",
+                        background=BackgroundTask(os.remove, spill.name))
+
+@router.get("/export/forecasts", dependencies=[Depends(rate_limit)])
+async def export_forecasts(format: str = "csv", compression: Optional[str] = None):
+    """Bulk export of every product's daily forecast, served from the cached forecasts."""
+    try:
+        _check_export_format(format)
+        # Computed once for concurrent callers; the export then reads the cache
+        await run_heavy("product_forecasts", get_product_forecasts)
+        return await _export_response(iter_forecast_batches(), format, compression, "forecasts")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export/inventory", dependencies=[Depends(rate_limit)])
+async def export_inventory(format: str = "csv", compression: Optional[str] = None,
+                           lead_time: int = Query(5, ge=0, le=MAX_LEAD_TIME),
+                           service_level: float = Query(0.95, gt=0, lt=1),
+                           holding_cost: float = Query(0.2, gt=0), order_cost: float = Query(50.0, ge=0)):
+    """Bulk export of every product's inventory plan, served from the cached plan table."""
+    try:
+        _check_export_format(format)
+        key = (lead_time, service_level, holding_cost, order_cost)
+        await run_heavy(("inventory_plan", key), lambda: get_inventory_plan_table(*key))
+        batches = iter_plan_batches(lead_time, service_level, holding_cost, order_cost)
+        return await _export_response(batches, format, compression, "inventory_plans")
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 from app.models.schemas import DashboardStats
 from app.services.dashboard import get_dashboard_stats
+from app.services.batch import get_backtest_accuracy
 
-@router.get("/dashboard", response_model=DashboardStats) # Changed to GET
+def _dashboard() -> DashboardStats:
+    data_dicts = get_all_sales_data()
+    # Convert dicts back to Pydantic models for service layer
+    data = [SalesDataPoint(**record) for record in data_dicts]
+    return get_dashboard_stats(data, stock_risk_count=get_stock_risk_count(),
+                               accuracy=get_backtest_accuracy())
+
+@router.get("/dashboard", response_model=DashboardStats, dependencies=[Depends(rate_limit)]) # Changed to GET
 async def get_dashboard():
     try:
-        data_dicts = get_all_sales_data()
-        # Convert dicts back to Pydantic models for service layer
-        data = [SalesDataPoint(**record) for record in data_dicts]
-        return get_dashboard_stats(data)
+        return await run_heavy("dashboard", _dashboard)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 from app.models.schemas import ProductStats
 from app.services.dashboard import get_product_stats
 
-@router.get("/product-stats", response_model=ProductStats) # Changed to GET
+def _product_stats(product_name: str) -> ProductStats:
+    data_dicts = get_all_sales_data()
+    data = [SalesDataPoint(**record) for record in data_dicts]
+    return get_product_stats(data, product_name, reorder_table=get_reorder_table())
+
+@router.get("/product-stats", response_model=ProductStats, dependencies=[Depends(rate_limit)]) # Changed to GET
 async def get_product_stats_endpoint(product_name: str):
     try:
-        data_dicts = get_all_sales_data()
-        data = [SalesDataPoint(**record) for record in data_dicts]
-        return get_product_stats(data, product_name)
+        # May fit the catalog's forecasts on a cold cache
+        return await run_heavy(("product-stats", product_name), lambda: _product_stats(product_name))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -314,7 +357,9 @@ async def chat_endpoint(request: ChatRequest):
             "Keep answers concise."
         )
         
-        full_prompt = f"{system_prompt}\n\n[SALES DATA CONTEXT]:\n{request.context}\n\n[USER QUESTION]:\n{request.message}"
+        # Server-side summary (bounded size, cached per data version) instead of raw client rows
+        context = get_chat_context()
+        full_prompt = f"{system_prompt}\n\n[SALES DATA CONTEXT]:\n{context}\n\n[USER QUESTION]:\n{request.message}"
         
         # Gemini REST API URL (v1beta) - Using gemini-2.0-flash as identified in available models
         url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from fastapi import Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.core.tenancy import current_tenant, DEFAULT_TENANT
+from app.core.database import get_data_version
+
+# Protection for the CPU-heavy endpoints (dashboard, forecast, inventory,
+# what-if simulation, bulk exports):
+#
+# - per-client rate limit: a token bucket per signed-in tenant (or per IP for
+#   anonymous callers); over the limit -> 429 with Retry-After
+# - single flight: identical concurrent requests (same tenant, endpoint,
+#   parameters and data version) share one computation instead of each redoing it
+# - admission control: at most HEAVY_CONCURRENCY computations run at once, off
+#   the event loop; up to HEAVY_QUEUE_LIMIT more wait (at most
+#   HEAVY_QUEUE_TIMEOUT seconds), anything beyond is shed with 503 + Retry-After
+#   so a burst can't queue work for everyone behind it
+
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+HEAVY_CONCURRENCY = int(os.getenv("HEAVY_CONCURRENCY", str(os.cpu_count() or 2)))
+HEAVY_QUEUE_LIMIT = int(os.getenv("HEAVY_QUEUE_LIMIT", "32"))
+HEAVY_QUEUE_TIMEOUT = float(os.getenv("HEAVY_QUEUE_TIMEOUT", "10"))
+MAX_TRACKED_CLIENTS = 10_000
+# Proxies (IPs, comma-separated) whose X-Forwarded-For is believed; "*" trusts
+# whatever peer connects directly (a platform load balancer). Unset: the header
+# is ignored, since any client can send it.
+TRUSTED_PROXIES = {h.strip() for h in os.getenv("TRUSTED_PROXIES", "").split(",") if h.strip()}
+
+# --- Rate limiting ---
+
+_buckets_lock = threading.Lock()
+_buckets: "OrderedDict[str, list]" = OrderedDict() # client -> [tokens, last refill (monotonic)]
+
+def client_ip(request: Request) -> str:
+    """The caller's address: the direct peer, or behind trusted proxies the hop they forwarded for."""
+    host = request.client.host if request.client else "unknown"
+    if not TRUSTED_PROXIES or ("*" not in TRUSTED_PROXIES and host not in TRUSTED_PROXIES):
+        return host
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    # Rightmost hop not added by one of our proxies; anything left of it is client-controlled
+    for hop in reversed(hops):
+        host = hop
+        if hop not in TRUSTED_PROXIES:
+            break
+    return host
+
+def client_id(request: Request) -> str:
+    """Signed-in callers are limited per tenant, anonymous ones per IP."""
+    tenant = current_tenant()
+    if tenant != DEFAULT_TENANT:
+        return tenant
+    return client_ip(request)
+
+def take_token(client: str, now: Optional[float] = None) -> float:
+    """Spends one token from the client's bucket. Returns 0 if allowed, else seconds until a token is due."""
+    now = time.monotonic() if now is None else now
+    rate = RATE_LIMIT_PER_MINUTE / 60.0
+    with _buckets_lock:
+        bucket = _buckets.pop(client, None) or [RATE_LIMIT_BURST, now]
+        bucket[0] = min(RATE_LIMIT_BURST, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        _buckets[client] = bucket # most recently used last
+        while len(_buckets) > MAX_TRACKED_CLIENTS:
+            _buckets.popitem(last=False)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate if rate > 0 else 60.0
+
+async def rate_limit(request: Request):
+    """Dependency for heavy endpoints: 429 once the caller exceeds its request rate."""
+    wait = take_token(client_id(request))
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many requests. Please slow down.",
+                            headers={"Retry-After": str(max(1, round(wait)))})
+
+# --- Single flight + admission control ---
+
+_inflight: Dict[Hashable, asyncio.Future] = {}
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop = None
+_admitted = 0 # running + waiting for a slot
+
+def _overloaded() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server is busy. Please retry shortly.",
+                         headers={"Retry-After": str(max(1, round(HEAVY_QUEUE_TIMEOUT / 2)))})
+
+async def run_admitted(fn: Callable[[], Any]) -> Any:
+    """Runs `fn` (blocking, CPU-heavy) off the event loop once admitted; 503 when overloaded."""
+    global _slots, _slots_loop, _admitted
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        # Created on (and bound to) the serving event loop
+        _slots, _slots_loop = asyncio.Semaphore(HEAVY_CONCURRENCY), loop
+    if _admitted >= HEAVY_CONCURRENCY + HEAVY_QUEUE_LIMIT:
+        raise _overloaded()
+    _admitted += 1
+    try:
+        try:
+            await asyncio.wait_for(_slots.acquire(), HEAVY_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise _overloaded()
+        try:
+            # Off the event loop, as the calling tenant
+            context = contextvars.copy_context()
+            return await run_in_threadpool(context.run, fn)
+        finally:
+            _slots.release()
+    finally:
+        _admitted -= 1
+
+async def run_heavy(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """
+    Runs `fn` (blocking, CPU-heavy) under admission control, sharing the result
+    with every concurrent caller of the same `key` for the current tenant and
+    data version.
+    """
+    key = (current_tenant(), get_data_version(), key)
+    task = _inflight.get(key)
+    if task is None:
+        # The computation is its own task (inheriting the tenant), so it isn't
+        # tied to the caller that started it
+        task = asyncio.ensure_future(run_admitted(fn))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finished(key, t))
+    # Shielded: one caller disconnecting mustn't cancel the others' result
+    return await asyncio.shield(task)
+
+def _finished(key: Hashable, task: asyncio.Future):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception() # retrieved here so a result nobody waited for doesn't log a warning
+
+def heavy_status() -> Dict[str, int]:
+    """Current load, for health checks."""
+    running = HEAVY_CONCURRENCY - _slots._value if _slots is not None else 0
+    return {"running": running, "waiting": _admitted - running, "in_flight_keys": len(_inflight)}
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+def _export(args) -> int:
+    from app.services.export import iter_forecast_batches, iter_plan_batches, write_export
+
+    if args.what == "forecasts":
+        batches = iter_forecast_batches(args.batch_rows)
+    else:
+        batches = iter_plan_batches(args.lead_time, args.service_level, args.holding_cost,
+                                    args.order_cost, args.batch_rows)
+    rows = write_export(batches, args.format, args.output, args.compression)
+    print(f"Wrote {rows} rows to {args.output}")
+    return 0
+
+def _forecast(args) -> int:
+    from app.services.batch import run_forecast_batch
+
+    bundle = run_forecast_batch(args.periods, args.workers, args.chunk_size, args.resume)
+    models = ", ".join(f"{count} {name}" for name, count in bundle['model'].value_counts().items())
+    print(f"Forecast {len(bundle['model'])} products {args.periods} days ahead ({models})")
+    return 0
+
+def _backtest(args) -> int:
+    from app.services.batch import run_backtest_batch, get_backtest_accuracy
+
+    scores = run_backtest_batch(args.horizon, args.workers, args.chunk_size, args.resume)
+    if args.output:
+        scores.to_csv(args.output, index=False)
+        print(f"Wrote {len(scores)} rows to {args.output}")
+    accuracy = get_backtest_accuracy()
+    print(f"Backtested {len(scores)} products over the last {args.horizon} days; "
+          f"accuracy (100 - WAPE): {accuracy if accuracy is not None else 'n/a'}%")
+    return 0
+
+def _plan(args) -> int:
+    from app.services.batch import run_forecast_batch, run_plan_batch
+
+    # Forecasts first (parallel, resumable); the plan itself is one vectorized pass
+    run_forecast_batch(workers=args.workers, chunk_size=args.chunk_size, resume=args.resume)
+    table = run_plan_batch(args.lead_time, args.service_level, args.holding_cost, args.order_cost)
+    at_risk = int((table['current_stock_status'] != "OK").sum())
+    print(f"Planned {len(table)} products ({at_risk} below reorder point)")
+    return 0
+
+def _add_batch_options(command: argparse.ArgumentParser):
+    command.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1,
+                         help="Worker processes (default: CPU count)")
+    command.add_argument("--chunk-size", type=int, default=200, help="Products per work unit / checkpoint")
+    command.add_argument("--no-resume", dest="resume", action="store_false",
+                         help="Ignore checkpoints from an earlier, interrupted run")
+
+def _add_plan_options(command: argparse.ArgumentParser):
+    command.add_argument("--lead-time", type=int, default=5)
+    command.add_argument("--service-level", type=float, default=0.95)
+    command.add_argument("--holding-cost", type=float, default=0.2)
+    command.add_argument("--order-cost", type=float, default=50.0)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app", description="Demand Forecasting AI - batch tools")
+    parser.add_argument("--tenant", default="default",
+                        help="Tenant (workspace) whose data to use; signed-in users are 'u-<id>' under TENANTS_DIR")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export per-product forecasts or inventory plans (CSV/Parquet)")
+    export.add_argument("what", choices=["forecasts", "inventory"])
+    export.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    export.add_argument("--output", "-o", required=True, help="Output file path")
+    export.add_argument("--compression", default=None,
+                        help="csv: gzip (default) or none; parquet: zstd (default), snappy, gzip, none")
+    export.add_argument("--batch-rows", type=int, default=100_000, help="Rows per CSV block / Parquet row group")
+    _add_plan_options(export)
+    export.set_defaults(handler=_export)
+
+    # Batch runs publish to the same cache the API reads (CACHE_DIR); checkpoints
+    # for resuming go to CHECKPOINT_DIR
+    forecast = commands.add_parser("forecast", help="Forecast every product in parallel and cache the results")
+    forecast.add_argument("--periods", type=int, default=60, help="Days ahead")
+    _add_batch_options(forecast)
+    forecast.set_defaults(handler=_forecast)
+
+    backtest = commands.add_parser("backtest", help="Score forecasts on the most recent days of history")
+    backtest.add_argument("--horizon", type=int, default=14, help="Days held out")
+    backtest.add_argument("--output", "-o", default=None, help="Also write per-product scores to this CSV")
+    _add_batch_options(backtest)
+    backtest.set_defaults(handler=_backtest)
+
+    plan = commands.add_parser("plan", help="Forecast (if needed) and build the inventory plan for every product")
+    _add_batch_options(plan)
+    _add_plan_options(plan)
+    plan.set_defaults(handler=_plan)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    from app.core.tenancy import set_tenant
+    set_tenant(args.tenant)
+    from app.services.forecasting import quiet_model_logs
+    quiet_model_logs()
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
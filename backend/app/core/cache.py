@@ -0,0 +1,165 @@
+import os
+import sys
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from app.core.tenancy import (
+    current_tenant, touch_tenant, tenants_by_idleness, register_eviction_hook, evict_tenant, DEFAULT_TENANT
+)
+
+# Simple in-process cache for derived results (summaries, plans, forecasts).
+# Every entry is tagged with the data version it was computed from, so a new
+# upload automatically invalidates it without anyone having to clear it.
+#
+# Entries are namespaced by tenant and kept in LRU order. Each tenant may hold
+# up to TENANT_CACHE_MB (its own least recently used entries go first); past
+# CACHE_MAX_MB in total, the least recently active tenants are evicted whole.
+
+TENANT_CACHE_MB = float(os.getenv("TENANT_CACHE_MB", "256"))
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "1024"))
+
+_lock = threading.Lock()
+_entries: "OrderedDict[Tuple[str, str, Hashable], Tuple[Any, Any, int]]" = OrderedDict()
+_tenant_bytes: Dict[str, int] = {}
+
+def _sizeof(value: Any) -> int:
+    """Approximate memory held by a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+def _drop(k):
+    # Caller holds the lock
+    _, _, size = _entries.pop(k)
+    _tenant_bytes[k[0]] -= size
+    if not _tenant_bytes[k[0]]:
+        del _tenant_bytes[k[0]]
+
+def cache_get(name: str, key: Hashable, version: Any) -> Optional[Any]:
+    """Returns the current tenant's cached value if it was computed for `version`, else None."""
+    k = (current_tenant(), name, key)
+    with _lock:
+        entry = _entries.get(k)
+        if entry is None or entry[0] != version:
+            return None
+        _entries.move_to_end(k)
+    return entry[1]
+
+def cache_peek(name: str, key: Hashable) -> Optional[Tuple[Any, Any]]:
+    """(version, value) of the current tenant's entry whatever its version, e.g. to update a stale result."""
+    with _lock:
+        entry = _entries.get((current_tenant(), name, key))
+    return None if entry is None else entry[:2]
+
+def cache_set(name: str, key: Hashable, version: Any, value: Any):
+    tenant = current_tenant()
+    k = (tenant, name, key)
+    size = _sizeof(value)
+    quota = TENANT_CACHE_MB * 2**20
+    with _lock:
+        if k in _entries:
+            _drop(k)
+        if size > quota:
+            return # Would evict everything else the tenant has; serve it uncached (or from disk)
+        _entries[k] = (version, value, size)
+        _tenant_bytes[tenant] = _tenant_bytes.get(tenant, 0) + size
+        # Over this tenant's quota: its least recently used entries go first
+        if _tenant_bytes[tenant] > quota:
+            for old in [e for e in _entries if e[0] == tenant and e != k]:
+                _drop(old)
+                if _tenant_bytes[tenant] <= quota:
+                    break
+        over_budget = sum(_tenant_bytes.values()) > CACHE_MAX_MB * 2**20
+    touch_tenant(tenant)
+    if over_budget:
+        _evict_for_budget(tenant)
+
+def _evict_for_budget(keep: str):
+    """Evicts the least recently active tenants until the cache is back under CACHE_MAX_MB."""
+    for tenant in tenants_by_idleness():
+        with _lock:
+            if sum(_tenant_bytes.values()) <= CACHE_MAX_MB * 2**20:
+                return
+        if tenant != keep:
+            evict_tenant(tenant)
+
+def cache_clear(name: Optional[str] = None, tenant: Optional[str] = None):
+    """Drops every entry, or only those of one named cache and/or one tenant."""
+    with _lock:
+        for k in [k for k in _entries if (name is None or k[1] == name) and (tenant is None or k[0] == tenant)]:
+            _drop(k)
+
+def cache_usage() -> Dict[str, int]:
+    """Bytes held per tenant."""
+    with _lock:
+        return dict(_tenant_bytes)
+
+register_eviction_hook(lambda tenant: cache_clear(tenant=tenant))
+
+# --- Disk layer ---
+# Expensive results (forecasts, plans) are also pickled under CACHE_DIR so other
+# processes (CLI runs, restarted workers) can reuse them. One file per name/key,
+# overwritten when a newer data version is written. Tenants other than the
+# default one get their own subdirectory.
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+def _disk_path(name: str, key: Hashable) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    tenant = current_tenant()
+    directory = CACHE_DIR if tenant == DEFAULT_TENANT else os.path.join(CACHE_DIR, tenant)
+    return os.path.join(directory, f"{name}-{digest}.pkl")
+
+def disk_cache_peek(name: str, key: Hashable) -> Optional[Tuple[Any, Any]]:
+    """(version, value) stored on disk whatever its version."""
+    path = _disk_path(name, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Error reading cache file {path}: {e}")
+        return None
+
+def disk_cache_get(name: str, key: Hashable, version: Any) -> Optional[Any]:
+    entry = disk_cache_peek(name, key)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+def disk_cache_set(name: str, key: Hashable, version: Any, value: Any):
+    path = _disk_path(name, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((version, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"Error writing cache file {path}: {e}")
+
+def cached_compute(name: str, key: Hashable, version: Any, compute: Callable[[], Any], persist: bool = False) -> Any:
+    """Memory -> (optionally) disk -> compute, filling the faster layers on the way back."""
+    value = cache_get(name, key, version)
+    if value is not None:
+        return value
+    if persist:
+        value = disk_cache_get(name, key, version)
+    if value is None:
+        value = compute()
+        if persist:
+            disk_cache_set(name, key, version, value)
+    cache_set(name, key, version, value)
+    return value
@@ -1,7 +1,12 @@
 import os
 import json
-from typing import List, Dict
+import pandas as pd
+from typing import List, Dict, Optional
+from app.core.notifications import get_notification_engine, drop_notification_engine, flush_all_engines
+from app.core.cache import cached_compute
+from app.core.tenancy import tenant_path, register_eviction_hook
 
+# Per-tenant files (see tenant_path: the default tenant uses the working directory)
 NOTIFICATIONS_FILE = "notifications.json"
 HISTORY_FILE = "history.json"
 DATA_FILE = "sales_data.json"
@@ -26,10 +31,21 @@ def _write_json(filename: str, data: List[Dict]):
         print(f"Error writing to {filename}: {e}")
 
 def _read_data() -> List[Dict]:
-    return _read_json(DATA_FILE)
+    return _read_json(tenant_path(DATA_FILE))
 
 def _write_data(data: List[Dict]):
-    _write_json(DATA_FILE, data)
+    _write_json(tenant_path(DATA_FILE), data)
+
+def get_data_version():
+    """
+    Cheap fingerprint of the current tenant's sales store (mtime + size), used
+    to key caches of derived results. Changes whenever the store is rewritten.
+    """
+    try:
+        st = os.stat(tenant_path(DATA_FILE))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def insert_sales_data(new_records: List[Dict]):
     """
@@ -54,12 +70,29 @@ def insert_sales_data(new_records: List[Dict]):
     _write_data(updated_data)
     return {"status": "success", "count": len(new_records)}
 
+def replace_sales_data(records: List[Dict]):
+    """Rewrites the store with `records`, numbering ids from 1."""
+    for i, record in enumerate(records, start=1):
+        record['id'] = i
+    _write_data(records)
+
 def get_all_sales_data():
     """
     Fetches all records from local store.
     """
     return _read_data()
 
+SALES_COLUMNS = ['date', 'product', 'region', 'units_sold', 'price', 'inventory']
+
+def get_sales_dataframe():
+    """
+    All records as a DataFrame with the store columns (empty frame if no data).
+    Held in the tenant's cache, so idle tenants' datasets are evicted with it.
+    """
+    frame = cached_compute("sales_frame", None, get_data_version(),
+                           lambda: pd.DataFrame(_read_data(), columns=SALES_COLUMNS))
+    return frame.copy(deep=False) # callers may add columns
+
 def get_recent_sales_data(limit: int = 100):
     """
     Fetches the most recent records, mimicking 'order via id desc'.
@@ -83,33 +116,27 @@ def clear_sales_data():
 
 # --- Notification System ---
 
-def add_notification(title: str, message: str, type: str = 'info'):
-    import datetime
-    notifications = _read_json(NOTIFICATIONS_FILE)
-    new_note = {
-        "id": len(notifications) + 1,
-        "title": title,
-        "message": message,
-        "type": type,
-        "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "read": False
-    }
-    # Prepend to show newest first
-    notifications.insert(0, new_note)
-    # Keep last 50
-    _write_json(NOTIFICATIONS_FILE, notifications[:50])
+# In-memory ring buffer per tenant with batched writes to its NOTIFICATIONS_FILE
+# (see app/core/notifications.py)
+
+def add_notification(title: str, message: str, type: str = 'info', dedup_key: Optional[str] = None):
+    return get_notification_engine(tenant_path(NOTIFICATIONS_FILE)).add(title, message, type, dedup_key)
 
 def get_notifications():
-    return _read_json(NOTIFICATIONS_FILE)
+    return get_notification_engine(tenant_path(NOTIFICATIONS_FILE)).get_all()
 
 def mark_notifications_read():
-    notifications = _read_json(NOTIFICATIONS_FILE)
-    for n in notifications:
-        n['read'] = True
-    _write_json(NOTIFICATIONS_FILE, notifications)
+    get_notification_engine(tenant_path(NOTIFICATIONS_FILE)).mark_all_read()
 
 def clear_notifications():
-    _write_json(NOTIFICATIONS_FILE, [])
+    get_notification_engine(tenant_path(NOTIFICATIONS_FILE)).clear()
+
+def flush_notifications():
+    """Persists pending notifications of every loaded tenant (shutdown)."""
+    flush_all_engines()
+
+async def wait_for_notifications(since: int, timeout: float) -> int:
+    return await get_notification_engine(tenant_path(NOTIFICATIONS_FILE)).wait_for_change(since, timeout)
 
 # --- History / Archiving System ---
 
@@ -119,7 +146,7 @@ def archive_current_data():
     if not current_data:
         return # Nothing to archive
         
-    history = _read_json(HISTORY_FILE)
+    history = _read_json(tenant_path(HISTORY_FILE))
     
     # Create a summary batch
     batch_summary = {
@@ -134,7 +161,10 @@ def archive_current_data():
     }
     
     history.insert(0, batch_summary)
-    _write_json(HISTORY_FILE, history)
+    _write_json(tenant_path(HISTORY_FILE), history)
 
 def get_archived_history():
-    return _read_json(HISTORY_FILE)
+    return _read_json(tenant_path(HISTORY_FILE))
+
+# Idle tenants: persist and drop their notification buffer (reloaded on next use)
+register_eviction_hook(lambda tenant: drop_notification_engine(tenant_path(NOTIFICATIONS_FILE, tenant)))
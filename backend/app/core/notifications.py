@@ -0,0 +1,172 @@
+import os
+import json
+import atexit
+import asyncio
+import datetime
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Keep last 50
+MAX_NOTIFICATIONS = 50
+# Durable writes are batched: flushed every FLUSH_INTERVAL seconds, or sooner
+# once FLUSH_BATCH changes are pending.
+FLUSH_INTERVAL = 2.0
+FLUSH_BATCH = 20
+
+class NotificationEngine:
+    """
+    In-memory ring buffer of notifications (newest first) backed by a JSON file.
+
+    Ids are monotonic and never reused, even after the buffer wraps or is cleared.
+    Notifications may carry a dedup key: adding one while an unread notification
+    with the same key exists replaces it instead of stacking a duplicate.
+    Every change bumps `seq`, which long-poll clients wait on.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._items: deque = deque(maxlen=MAX_NOTIFICATIONS)
+        self._next_id = 1
+        self._pending = 0
+        self.seq = 0
+        self._waiters: List = [] # (event loop, future) pairs of long-poll clients
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "r") as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"Error reading {self.filename}: {e}")
+            return
+        # Older files are a bare list with no id counter
+        if isinstance(stored, list):
+            stored = {"next_id": None, "items": stored}
+        items = stored.get("items", [])[:MAX_NOTIFICATIONS]
+        self._items.extend(items)
+        max_id = max((n.get("id", 0) for n in items), default=0)
+        self._next_id = max(stored.get("next_id") or 1, max_id + 1)
+
+    def _changed(self):
+        # Caller holds the lock
+        self.seq += 1
+        self._pending += 1
+        waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def add(self, title: str, message: str, type: str = 'info', dedup_key: Optional[str] = None) -> Dict:
+        with self._lock:
+            if dedup_key is not None:
+                for existing in list(self._items):
+                    if existing.get("dedup_key") == dedup_key and not existing["read"]:
+                        self._items.remove(existing)
+            note = {
+                "id": self._next_id,
+                "title": title,
+                "message": message,
+                "type": type,
+                "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "read": False
+            }
+            if dedup_key is not None:
+                note["dedup_key"] = dedup_key
+            self._next_id += 1
+            # Prepend to show newest first
+            self._items.appendleft(note)
+            self._changed()
+            flush_now = self._pending >= FLUSH_BATCH
+        if flush_now:
+            self.flush()
+        return note
+
+    def get_all(self) -> List[Dict]:
+        with self._lock:
+            return [dict(n) for n in self._items]
+
+    def mark_all_read(self):
+        with self._lock:
+            for n in self._items:
+                n['read'] = True
+            self._changed()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._changed()
+
+    def flush(self):
+        """Writes the buffer to disk if anything changed since the last flush."""
+        with self._lock:
+            if not self._pending:
+                return
+            snapshot = {"next_id": self._next_id, "items": list(self._items)}
+            self._pending = 0
+        try:
+            tmp = f"{self.filename}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp, self.filename)
+        except Exception as e:
+            print(f"Error writing to {self.filename}: {e}")
+
+    async def wait_for_change(self, since: int, timeout: float) -> int:
+        """
+        Returns as soon as `seq` differs from `since` (a change, or a client that
+        saw a previous server process), or after `timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.seq != since:
+                return self.seq
+            fut = loop.create_future()
+            self._waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if (loop, fut) in self._waiters:
+                    self._waiters.remove((loop, fut))
+        return self.seq
+
+# One engine per notifications file (i.e. per tenant), all flushed by one thread
+_engines: Dict[str, NotificationEngine] = {}
+_engine_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_all_engines()
+
+def flush_all_engines():
+    with _engine_lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        engine.flush()
+
+def get_notification_engine(filename: str) -> NotificationEngine:
+    global _flusher
+    with _engine_lock:
+        engine = _engines.get(filename)
+        if engine is None:
+            engine = _engines[filename] = NotificationEngine(filename)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="notification-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush_all_engines)
+        return engine
+
+def drop_notification_engine(filename: str):
+    """Persists and unloads an engine (idle tenant). Kept if a long-poll client is waiting on it."""
+    with _engine_lock:
+        engine = _engines.get(filename)
+        if engine is None or engine._waiters:
+            return
+        del _engines[filename]
+    engine.flush()
@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+# Every store, cache entry, notification feed and ingestion job belongs to a
+# tenant (a signed-in user's workspace). The tenant of the work in progress
+# travels in a context variable: the API binds it per request, the CLI per run,
+# and background jobs inherit it from whoever submitted them.
+#
+# The "default" tenant (anonymous use, single-user installs) keeps its files in
+# the working directory exactly as before; every other tenant gets its own
+# directory under TENANTS_DIR.
+
+DEFAULT_TENANT = "default"
+TENANTS_DIR = os.getenv("TENANTS_DIR", "tenants")
+# Tenants idle this long have their in-memory state (datasets, caches,
+# notification buffers) dropped; it is reloaded from disk on their next request
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "1800"))
+_IDLE_SWEEP_INTERVAL = 60.0
+
+_current = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+_lock = threading.Lock()
+_last_seen: Dict[str, float] = {}
+_eviction_hooks: List[Callable[[str], None]] = []
+_last_sweep = 0.0
+
+def current_tenant() -> str:
+    return _current.get()
+
+def set_tenant(tenant: str) -> contextvars.Token:
+    """Makes `tenant` current for this request/task. Returns a token for reset_tenant()."""
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", tenant):
+        raise ValueError(f"Invalid tenant id '{tenant}'.")
+    touch_tenant(tenant)
+    return _current.set(tenant)
+
+def reset_tenant(token: contextvars.Token):
+    _current.reset(token)
+
+def tenant_for_user(user: Optional[Dict]) -> str:
+    """Stable tenant id for a signed-in (Google) user; anonymous requests share the default tenant."""
+    if not user:
+        return DEFAULT_TENANT
+    identity = user.get("sub") or user.get("email")
+    if not identity:
+        return DEFAULT_TENANT
+    return "u-" + hashlib.sha1(str(identity).encode()).hexdigest()[:16]
+
+def tenant_path(filename: str, tenant: Optional[str] = None) -> str:
+    """Where the current (or given) tenant keeps `filename`."""
+    tenant = tenant or current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return filename
+    directory = os.path.join(TENANTS_DIR, tenant)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+def submit_in_tenant(executor: Executor, fn: Callable, *args) -> Future:
+    """executor.submit() that runs `fn` as the submitting tenant (thread pools don't carry context)."""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args)
+
+# --- Activity tracking and eviction ---
+
+def touch_tenant(tenant: Optional[str] = None):
+    with _lock:
+        _last_seen[tenant or current_tenant()] = time.monotonic()
+
+def tenants_by_idleness() -> List[str]:
+    """Known tenants, least recently active first."""
+    with _lock:
+        return sorted(_last_seen, key=_last_seen.get)
+
+def register_eviction_hook(hook: Callable[[str], None]):
+    """`hook(tenant)` is called to drop a tenant's in-memory state when it is evicted."""
+    _eviction_hooks.append(hook)
+
+def evict_tenant(tenant: str):
+    """Drops everything held in memory for `tenant`. Its files on disk are untouched."""
+    for hook in _eviction_hooks:
+        try:
+            hook(tenant)
+        except Exception as e:
+            print(f"Error evicting tenant {tenant}: {e}")
+    with _lock:
+        _last_seen.pop(tenant, None)
+
+def evict_idle_tenants(max_idle: float = TENANT_IDLE_SECONDS) -> int:
+    """Evicts tenants idle for longer than `max_idle` seconds. Cheap to call often (rate limited)."""
+    global _last_sweep
+    now = time.monotonic()
+    with _lock:
+        if now - _last_sweep < _IDLE_SWEEP_INTERVAL:
+            return 0
+        _last_sweep = now
+        idle = [t for t, seen in _last_seen.items() if now - seen > max_idle and t != current_tenant()]
+    for tenant in idle:
+        evict_tenant(tenant)
+    return len(idle)
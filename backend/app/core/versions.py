@@ -0,0 +1,282 @@
+import os
+import json
+import hashlib
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Set
+from app.core.database import get_sales_dataframe, replace_sales_data, get_data_version, SALES_COLUMNS
+from app.core.tenancy import tenant_path
+
+# Dataset versions, content-addressed: a version's id is a hash of its rows, so
+# re-uploading identical data never creates a new version. The store
+# (sales_data.json) always holds the head version in full; every other version
+# is reachable through deltas. Each version keeps only the delta from its
+# parent (rows inserted, rows deleted, and the old and new content of updated
+# rows), so moving between versions means applying deltas along the version
+# tree, forwards or backwards.
+#
+# A row is identified by (date, product, region) plus its occurrence number
+# among rows sharing that key, so files with repeated keys still diff cleanly.
+# Only the store columns are versioned; record ids are renumbered on write.
+
+VERSIONS_DIR = "versions"
+KEY_COLUMNS = ['date', 'product', 'region']
+VALUE_COLUMNS = ['units_sold', 'price', 'inventory']
+
+_lock = threading.Lock()
+
+def _manifest_path() -> str:
+    path = tenant_path(os.path.join(VERSIONS_DIR, "manifest.json"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def _delta_path(version_id: str) -> str:
+    return os.path.join(os.path.dirname(_manifest_path()), f"{version_id}.delta.pkl")
+
+def _read_manifest() -> Dict:
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return {"head": None, "versions": {}}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return {"head": None, "versions": {}}
+
+def _write_manifest(manifest: Dict):
+    path = _manifest_path()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+# --- Row hashing and diffing ---
+
+def canonical_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Store columns with fixed dtypes, so equal content hashes equally wherever it came from."""
+    out = pd.DataFrame({c: df[c].astype(str) for c in KEY_COLUMNS}, index=df.index)
+    for c in VALUE_COLUMNS:
+        out[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype('float64')
+    return out.reset_index(drop=True)
+
+def _hashes(rows: pd.DataFrame):
+    """(key hash, row hash) per canonical row, as uint64 arrays."""
+    base = pd.util.hash_pandas_object(rows[KEY_COLUMNS], index=False).to_numpy()
+    content = pd.util.hash_pandas_object(rows[VALUE_COLUMNS], index=False).to_numpy()
+    # Rows sharing a key are numbered in content order rather than file order, so
+    # a row's identity depends only on the set of rows, not on how they're sorted
+    order = np.lexsort((content, base))
+    sorted_base = base[order]
+    starts = np.flatnonzero(np.r_[True, sorted_base[1:] != sorted_base[:-1]])
+    occurrence = np.empty(len(rows), dtype=np.int64)
+    occurrence[order] = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keys = pd.util.hash_pandas_object(pd.DataFrame({'key': base, 'occurrence': occurrence}), index=False).to_numpy()
+    row_hashes = pd.util.hash_pandas_object(pd.DataFrame({'key': keys, 'content': content}), index=False).to_numpy()
+    return keys, row_hashes
+
+def dataset_id(row_hashes: np.ndarray) -> str:
+    """Order-independent content address of a dataset."""
+    return hashlib.sha1(np.sort(row_hashes).tobytes()).hexdigest()[:16]
+
+def diff_rows(old: pd.DataFrame, new: pd.DataFrame) -> Dict:
+    """
+    Row-level diff of two canonical frames: `inserted` and `deleted` rows, and
+    `updated_old` / `updated_new` for keys whose values changed. Also returns
+    `changed_products` (any product with a row in the delta).
+    """
+    old_keys, old_rows = _hashes(old)
+    new_keys, new_rows = _hashes(new)
+    in_new = np.isin(old_keys, new_keys)
+    in_old = np.isin(new_keys, old_keys)
+    # Same key, different content: keys common to both whose row hash isn't in the other side
+    old_changed = in_new & ~np.isin(old_rows, new_rows)
+    new_changed = in_old & ~np.isin(new_rows, old_rows)
+
+    # Each part carries the row keys of the frame it came from (see apply_delta)
+    delta = {
+        "inserted": new[~in_old].assign(_key=new_keys[~in_old]),
+        "deleted": old[~in_new].assign(_key=old_keys[~in_new]),
+        "updated_old": old[old_changed].assign(_key=old_keys[old_changed]),
+        "updated_new": new[new_changed].assign(_key=new_keys[new_changed]),
+    }
+    delta["changed_products"] = set().union(*(set(part['product']) for part in delta.values()))
+    return delta
+
+def apply_delta(rows: pd.DataFrame, delta: Dict, reverse: bool = False) -> pd.DataFrame:
+    """Moves canonical rows across one version edge (parent -> child, or back with reverse)."""
+    remove = ["inserted", "updated_new"] if reverse else ["deleted", "updated_old"]
+    add = ["deleted", "updated_old"] if reverse else ["inserted", "updated_new"]
+    keys, _ = _hashes(rows)
+    drop = np.concatenate([delta[part]['_key'].to_numpy(dtype=np.uint64) for part in remove])
+    kept = rows[~np.isin(keys, drop)]
+    return pd.concat([kept] + [delta[part].drop(columns='_key') for part in add], ignore_index=True)
+
+def _save_delta(version_id: str, delta: Dict):
+    path = _delta_path(version_id)
+    tmp = f"{path}.tmp"
+    pd.to_pickle({k: v for k, v in delta.items() if k != "changed_products"}, tmp)
+    os.replace(tmp, path)
+
+def _load_delta(version_id: str) -> Dict:
+    delta = pd.read_pickle(_delta_path(version_id))
+    delta["changed_products"] = set().union(*(set(part['product']) for part in delta.values()))
+    return delta
+
+# --- Version tree ---
+
+def _ancestors(manifest: Dict, version_id: Optional[str]) -> List[Optional[str]]:
+    """version_id, its parent, ... up to the root, then None (the empty dataset)."""
+    chain = []
+    while version_id is not None:
+        chain.append(version_id)
+        version_id = manifest["versions"][version_id]["parent"]
+    return chain + [None]
+
+def _path(manifest: Dict, source: Optional[str], target: Optional[str]):
+    """Edges to undo (source up to the common ancestor) and to apply (down to target)."""
+    up, down = _ancestors(manifest, source), _ancestors(manifest, target)
+    common = next(v for v in up if v in down)
+    return up[:up.index(common)], list(reversed(down[:down.index(common)]))
+
+def _head_is_current(manifest: Dict) -> bool:
+    head = manifest["head"]
+    return head is not None and manifest["versions"][head].get("data_version") == list(get_data_version() or [])
+
+def commit_dataset(df: pd.DataFrame, source: str = "") -> Dict:
+    """
+    Makes `df` the current dataset: diffs it against the store, records the
+    delta as a new version (unless the content already exists as a version)
+    and rewrites the store. Returns the diff summary, including
+    `changed_products` and the store's `previous_data_version` / `data_version`
+    for selective invalidation.
+    """
+    with _lock:
+        manifest = _read_manifest()
+        previous_data_version = get_data_version()
+        current = canonical_rows(get_sales_dataframe())
+        parent = manifest["head"]
+        if not _head_is_current(manifest):
+            # Store was written outside versioning (older install, clear-data): its
+            # content becomes a fresh root, so it can still be rolled back to
+            parent = None
+            if not current.empty:
+                parent = _record_version(manifest, current, None, diff_rows(current.iloc[:0], current), "existing data")
+
+        new = canonical_rows(df)
+        delta = diff_rows(current, new)
+        version_id = dataset_id(_hashes(new)[1])
+        if version_id == parent:
+            manifest["versions"][version_id]["data_version"] = list(previous_data_version or [])
+            _write_manifest(manifest)
+            changed = False
+        else:
+            if version_id not in manifest["versions"]:
+                _record_version(manifest, new, parent, delta, source)
+            changed = True
+
+        if changed:
+            replace_sales_data(df[SALES_COLUMNS].to_dict('records'))
+            manifest["head"] = version_id
+            manifest["versions"][version_id]["data_version"] = list(get_data_version() or [])
+            _write_manifest(manifest)
+        data_version = get_data_version()
+
+    return {
+        "version": version_id,
+        "parent": parent,
+        "inserted": len(delta["inserted"]),
+        "updated": len(delta["updated_new"]),
+        "deleted": len(delta["deleted"]),
+        "changed_products": delta["changed_products"],
+        "deleted_products": set(current['product']) - set(new['product']),
+        "previous_data_version": previous_data_version,
+        "data_version": data_version,
+    }
+
+def _record_version(manifest: Dict, rows: pd.DataFrame, parent: Optional[str], delta: Dict, source: str) -> str:
+    version_id = dataset_id(_hashes(rows)[1])
+    _save_delta(version_id, delta)
+    manifest["versions"][version_id] = {
+        "id": version_id,
+        "parent": parent,
+        "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": source,
+        "record_count": len(rows),
+        "total_revenue": float((rows['units_sold'] * rows['price']).sum()),
+        "inserted": len(delta["inserted"]),
+        "updated": len(delta["updated_new"]),
+        "deleted": len(delta["deleted"]),
+    }
+    manifest["head"] = version_id
+    return version_id
+
+def list_versions() -> List[Dict]:
+    """All versions, newest first, with the head marked."""
+    manifest = _read_manifest()
+    head = manifest["head"] if _head_is_current(manifest) else None
+    versions = [dict(v, head=(v["id"] == head)) for v in manifest["versions"].values()]
+    for v in versions:
+        v.pop("data_version", None)
+    return sorted(versions, key=lambda v: v["created_at"], reverse=True)
+
+def checkout_version(version_id: str) -> Dict:
+    """
+    Rolls the store back (or forward) to a recorded version by applying deltas
+    along the version tree from the head; no full snapshot is read. Returns the
+    same summary as commit_dataset().
+    """
+    with _lock:
+        manifest = _read_manifest()
+        if version_id not in manifest["versions"]:
+            raise ValueError(f"Unknown dataset version '{version_id}'.")
+        if not _head_is_current(manifest):
+            raise ValueError("The data was changed outside versioning; upload it again before rolling back.")
+
+        previous_data_version = get_data_version()
+        current = canonical_rows(get_sales_dataframe())
+        undo, redo = _path(manifest, manifest["head"], version_id)
+        rows = current
+        changed: Set[str] = set()
+        for v in undo:
+            delta = _load_delta(v)
+            rows = apply_delta(rows, delta, reverse=True)
+            changed |= delta["changed_products"]
+        for v in redo:
+            delta = _load_delta(v)
+            rows = apply_delta(rows, delta)
+            changed |= delta["changed_products"]
+
+        replace_sales_data(rows[SALES_COLUMNS].to_dict('records'))
+        manifest["head"] = version_id
+        manifest["versions"][version_id]["data_version"] = list(get_data_version() or [])
+        _write_manifest(manifest)
+        data_version = get_data_version()
+
+    return {
+        "version": version_id,
+        "parent": manifest["versions"][version_id]["parent"],
+        "changed_products": changed,
+        "deleted_products": set(current['product']) - set(rows['product']),
+        "previous_data_version": previous_data_version,
+        "data_version": data_version,
+    }
+
+def changed_products_between(old_data_version, new_data_version) -> Optional[Set[str]]:
+    """
+    Products whose rows differ between two store states (identified by data
+    version), or None if either state isn't a known version.
+    """
+    manifest = _read_manifest()
+    by_data_version = {tuple(v.get("data_version") or ()): v["id"] for v in manifest["versions"].values()}
+    source = by_data_version.get(tuple(old_data_version or ()))
+    target = by_data_version.get(tuple(new_data_version or ()))
+    if source is None or target is None:
+        return None
+    undo, redo = _path(manifest, source, target)
+    changed: Set[str] = set()
+    for v in undo + redo:
+        changed |= _load_delta(v)["changed_products"]
+    return changed
@@ -34,15 +34,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"], # so the dashboard can back off on 429/503
 )
 
+from app.services.ingestion import check_dependencies
+from app.core.database import flush_notifications
+from app.api.throttling import heavy_status
+
+@app.on_event("startup")
+async def startup_checks():
+    # Resolve optional file readers once, instead of on (or during) an upload
+    check_dependencies()
+
+@app.on_event("shutdown")
+async def shutdown_flush():
+    # Notifications are written in batches; persist whatever is still pending
+    flush_notifications()
+
 @app.get("/")
 async def root():
     return {"message": "Demand Forecasting AI Backend is Running"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "heavy_work": heavy_status()}
 
 from app.api.endpoints import router
 from app.api.auth import router as auth_router
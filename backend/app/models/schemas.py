@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Any, Dict
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional, Any, Dict
 
 class SalesDataPoint(BaseModel):
     date: str
@@ -21,11 +21,38 @@ class ForecastResult(BaseModel):
     yhat_upper: List[float]
     trend: List[float]
 
+# Bounds shared by planning and simulation requests (lead times in days)
+MAX_LEAD_TIME = 365
+MAX_PATHS = 10_000
+MAX_HORIZON = 730
+
 class InventoryRequest(BaseModel):
     data: List[SalesDataPoint] = []
-    lead_time: int = 5 
-    service_level: float = 0.95
-    holding_cost: float = 0.2
+    lead_time: int = Field(5, ge=0, le=MAX_LEAD_TIME)
+    service_level: float = Field(0.95, gt=0, lt=1)
+    holding_cost: float = Field(0.2, gt=0)
+    order_cost: float = Field(50.0, ge=0) # Fixed cost per order (EOQ)
+
+class WhatIfRequest(InventoryRequest):
+    # Per-product overrides of lead_time / holding_cost / order_cost (validated:
+    # a negative lead time or zero holding cost has no sensible safety stock / EOQ)
+    lead_times: Dict[str, Annotated[float, Field(ge=0, le=MAX_LEAD_TIME)]] = {}
+    holding_costs: Dict[str, Annotated[float, Field(gt=0)]] = {}
+    order_costs: Dict[str, Annotated[float, Field(ge=0)]] = {}
+    products: List[str] = [] # Restrict to these products (default: all)
+    n_paths: int = Field(1000, ge=1, le=MAX_PATHS) # Monte Carlo sample paths per product
+    horizon: int = Field(90, ge=1, le=MAX_HORIZON) # Simulated days
+    seed: Optional[int] = None
+
+class WhatIfResult(BaseModel):
+    product: str
+    reorder_point: float # s
+    order_quantity: float # Q
+    safety_stock: float
+    lead_time: float
+    fill_rate: float # Share of demand served from stock
+    stockout_probability: float # Share of simulated days with unmet demand
+    avg_on_hand: float
 
 class DashboardStats(BaseModel):
     total_revenue: float
@@ -62,4 +89,4 @@ class InventoryPlan(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    context: str = ""
+    context: str = "" # Deprecated: the server builds its own summary of the stored data
@@ -0,0 +1,204 @@
+import os
+import glob
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from app.core.cache import cache_get, cache_set, disk_cache_get, disk_cache_set
+from app.core.database import get_sales_dataframe, get_data_version
+from app.core.tenancy import current_tenant
+from app.services.forecasting import (
+    forecast_all_products, daily_demand_matrix, classify_demand, select_head, merge_bundles, quiet_model_logs,
+    PRODUCT_HORIZON
+)
+from app.services.inventory import get_inventory_plan_table
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+DEFAULT_CHUNK_SIZE = 200 # products per work unit
+BACKTEST_HORIZON = 14
+
+# --- Work units (run inside worker processes) ---
+
+def _forecast_chunk(df: pd.DataFrame, periods: int, end=None, head=None) -> dict:
+    quiet_model_logs()
+    return forecast_all_products(df, periods, end, head)
+
+def backtest_products(df: pd.DataFrame, horizon: int = BACKTEST_HORIZON, end=None, head=None) -> pd.DataFrame:
+    """
+    Holds out the last `horizon` days (up to `end`, default the last date in
+    `df`), forecasts them from the days before and scores each product's
+    forecast. One row per product: model, actual units, MAE, WAPE and bias.
+    `head` is the Prophet head of the training period (see _catalog_head).
+    """
+    quiet_model_logs()
+    columns = ['product', 'model', 'actual_units', 'abs_error', 'mae', 'wape', 'bias']
+    daily = daily_demand_matrix(df, end)
+    if daily.shape[1] <= horizon:
+        return pd.DataFrame(columns=columns)
+
+    cutoff = daily.columns[-horizon - 1]
+    train = df.assign(date=pd.to_datetime(df['date'], errors='coerce'))
+    train = train[train['date'] <= cutoff]
+    bundle = forecast_all_products(train, horizon, cutoff, head)
+
+    predicted = bundle["forecast"].pivot(index='product', columns='ds', values='yhat')
+    actual = daily.iloc[:, -horizon:]
+    predicted = predicted.reindex(index=actual.index, columns=actual.columns)
+    evaluable = predicted.notna().all(axis=1)
+    actual, predicted = actual[evaluable].fillna(0), predicted[evaluable].clip(lower=0)
+
+    error = predicted.to_numpy() - actual.to_numpy()
+    total = actual.to_numpy().sum(axis=1)
+    abs_error = np.abs(error).sum(axis=1)
+    return pd.DataFrame({
+        'product': actual.index,
+        'model': bundle["model"].reindex(actual.index).to_numpy(),
+        'actual_units': total,
+        'abs_error': abs_error,
+        'mae': abs_error / horizon,
+        'wape': np.divide(abs_error, total, out=np.full(len(total), np.nan), where=total > 0),
+        'bias': error.sum(axis=1) / horizon,
+    }, columns=columns)
+
+# --- Chunked, parallel, resumable driver ---
+
+def _checkpoint_path(kind: str, params, version) -> str:
+    digest = hashlib.sha1(repr((current_tenant(), kind, params, version)).encode()).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, f"{kind}-{digest}")
+
+def run_chunked(kind: str, params: tuple, fn: Callable, df: pd.DataFrame, workers: int = 1,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = True,
+                progress: Optional[Callable[[str], None]] = None) -> List:
+    """
+    Splits `df` by product into chunks of `chunk_size` products and runs
+    `fn(chunk_df, *params)` on each, over `workers` processes. Each finished
+    chunk is checkpointed; with `resume`, chunks already checkpointed for the
+    same data version and parameters are loaded instead of recomputed. The
+    checkpoints are deleted once every chunk is done.
+    """
+    progress = progress or print
+    version = get_data_version()
+    checkpoint_dir = _checkpoint_path(kind, (params, chunk_size), version) # chunk numbering depends on size
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if not resume:
+        for stale in glob.glob(os.path.join(checkpoint_dir, "chunk-*.pkl")):
+            os.remove(stale)
+
+    products = sorted(p for p in df['product'].dropna().unique() if p)
+    chunks = [products[i:i + chunk_size] for i in range(0, len(products), chunk_size)]
+    results: Dict[int, object] = {}
+    pending = []
+    for i in range(len(chunks)):
+        path = os.path.join(checkpoint_dir, f"chunk-{i:05d}.pkl")
+        if os.path.exists(path):
+            results[i] = pd.read_pickle(path)
+        else:
+            pending.append(i)
+    progress(f"{kind}: {len(products)} products in {len(chunks)} chunks "
+             f"({len(chunks) - len(pending)} restored from checkpoints)")
+
+    started = time.monotonic()
+    computed = 0
+    by_product = df.groupby('product', sort=False)
+
+    def chunk_frame(i):
+        return pd.concat([by_product.get_group(p) for p in chunks[i]], ignore_index=True)
+
+    def finish(i, result):
+        nonlocal computed
+        # Write-then-rename so an interrupted run never leaves a half-written checkpoint
+        path = os.path.join(checkpoint_dir, f"chunk-{i:05d}.pkl")
+        pd.to_pickle(result, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        results[i] = result
+        computed += len(chunks[i])
+        rate = computed / max(time.monotonic() - started, 1e-6)
+        progress(f"{kind}: chunk {i + 1}/{len(chunks)} done ({len(results)}/{len(chunks)}, {rate:.1f} products/s)")
+
+    if workers <= 1:
+        for i in pending:
+            finish(i, fn(chunk_frame(i), *params))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(fn, chunk_frame(i), *params): i for i in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    # Checkpoints only serve interrupted runs; a completed one leaves nothing behind
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return [results[i] for i in range(len(chunks))]
+
+def _last_date(df: pd.DataFrame):
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    return None if dates.isna().all() else dates.max().normalize()
+
+def _catalog_head(df: pd.DataFrame, holdout: int = 0) -> tuple:
+    """Prophet head over the whole catalog (excluding the last `holdout` days), sorted for stable checkpoint keys."""
+    daily = daily_demand_matrix(df)
+    if holdout:
+        daily = daily.iloc[:, :-holdout]
+    if daily.empty:
+        return ()
+    return tuple(sorted(select_head(classify_demand(daily))))
+
+def run_forecast_batch(periods: int = PRODUCT_HORIZON, workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       resume: bool = True, progress: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    Forecasts every product offline and publishes the bundle to the shared
+    cache, where the API (get_product_forecasts) picks it up without refitting.
+    """
+    version = get_data_version()
+    if resume:
+        # Already published for this data (API or an earlier run): nothing to do
+        bundle = disk_cache_get("product_forecasts", periods, version)
+        if bundle is not None:
+            cache_set("product_forecasts", periods, version, bundle)
+            return bundle
+    df = get_sales_dataframe()
+    params = (periods, _last_date(df), _catalog_head(df)) # every chunk forecasts the same days, same models
+    bundle = merge_bundles(run_chunked("forecast", params, _forecast_chunk, df, workers, chunk_size, resume, progress))
+    cache_set("product_forecasts", periods, version, bundle)
+    disk_cache_set("product_forecasts", periods, version, bundle)
+    return bundle
+
+def run_backtest_batch(horizon: int = BACKTEST_HORIZON, workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       resume: bool = True, progress: Optional[Callable[[str], None]] = None) -> pd.DataFrame:
+    """
+    Backtests every product and publishes the scores to the shared cache
+    (the dashboard's forecast accuracy reads them).
+    """
+    version = get_data_version()
+    df = get_sales_dataframe()
+    params = (horizon, _last_date(df), _catalog_head(df, horizon)) # every chunk holds out the same days
+    parts = run_chunked("backtest", params, backtest_products, df, workers, chunk_size, resume, progress)
+    parts = [p for p in parts if not p.empty]
+    scores = pd.concat(parts, ignore_index=True) if parts else backtest_products(df.iloc[:0], horizon)
+    cache_set("backtest", None, version, scores)
+    disk_cache_set("backtest", None, version, scores)
+    return scores
+
+def get_backtest_accuracy() -> Optional[float]:
+    """
+    Volume-weighted forecast accuracy (100 - WAPE, in %) from the last backtest
+    run for the current data, or None if no backtest has been run for it.
+    """
+    version = get_data_version()
+    scores = cache_get("backtest", None, version)
+    if scores is None:
+        scores = disk_cache_get("backtest", None, version)
+        if scores is None:
+            return None
+        cache_set("backtest", None, version, scores)
+    actual = scores['actual_units'].sum()
+    if actual <= 0:
+        return None
+    wape = scores['abs_error'].sum() / actual
+    return round(max(0.0, 100 * (1 - wape)), 1)
+
+def run_plan_batch(lead_time: int = 5, service_level: float = 0.95, holding_cost: float = 0.2,
+                   order_cost: float = 50.0) -> pd.DataFrame:
+    """Inventory plan from the (cached) forecasts; persisted for the API and exports."""
+    return get_inventory_plan_table(lead_time, service_level, holding_cost, order_cost, persist=True)
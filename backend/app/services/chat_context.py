@@ -0,0 +1,134 @@
+import pandas as pd
+from typing import List, Optional
+from app.models.schemas import SalesDataPoint
+from app.services.dashboard import get_dashboard_stats
+from app.services.inventory import peek_reorder_table, plans_from_table
+from app.services.forecasting import PRODUCT_HORIZON
+from app.core.database import get_all_sales_data, get_data_version
+from app.core.cache import cache_get, cache_set
+
+# Hard bounds so the prompt stays the same size whatever the row count.
+TOP_N = 8
+TREND_WINDOW_DAYS = 7
+PROJECTION_DAYS = 30
+MAX_CONTEXT_CHARS = 4000
+
+def build_chat_context(data: List[SalesDataPoint], reorder_table: Optional[pd.DataFrame],
+                       forecasts: Optional[dict] = None) -> str:
+    """
+    Builds a compact, fixed-size text summary of the dataset for the chat prompt:
+    overview, top SKUs, at-risk stock, recent trend deltas and demand projections.
+    Without a reorder table (plans not computed yet) the stock lines are left out.
+    """
+    if not data:
+        return "No sales data has been uploaded yet."
+
+    # Reuse the dashboard + inventory aggregations rather than re-deriving them
+    plans = plans_from_table(reorder_table) if reorder_table is not None else None
+    stock_risk_count = sum(p.current_stock_status != "OK" for p in plans) if plans is not None else 0
+    stats = get_dashboard_stats(data, stock_risk_count=stock_risk_count)
+
+    df = pd.DataFrame([d.dict() for d in data])
+    df['date'] = pd.to_datetime(df['date'])
+    df['revenue'] = df['units_sold'] * df['price']
+
+    lines = []
+
+    # 1. Overview
+    lines.append("OVERVIEW")
+    lines.append(
+        f"- {len(df)} records, {df['product'].nunique()} products, {df['region'].nunique()} regions, "
+        f"{df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}"
+    )
+    lines.append(f"- Total revenue: {stats.total_revenue:,.0f}; total units sold: {df['units_sold'].sum():,.0f}")
+    if plans is not None:
+        lines.append(f"- Products at stock risk: {stats.stock_risk_count}")
+    else:
+        lines.append("- Stock risk: reorder plans are still being computed")
+
+    # 2. Top SKUs by revenue
+    by_product = df.groupby('product')[['units_sold', 'revenue']].sum().sort_values('revenue', ascending=False)
+    lines.append(f"TOP {TOP_N} PRODUCTS (revenue, units)")
+    for product, row in by_product.head(TOP_N).iterrows():
+        lines.append(f"- {product}: {row['revenue']:,.0f}, {row['units_sold']:,.0f}")
+
+    # 3. At-risk stock (lowest cover relative to reorder point first)
+    if plans is not None:
+        at_risk = [p for p in plans if p.current_stock_status != "OK"]
+        at_risk.sort(key=lambda p: (p.current_stock_status != "Critical", p.current_stock_level - p.reorder_point))
+        lines.append(f"AT-RISK STOCK ({len(at_risk)} total; stock / reorder point / status)")
+        for p in at_risk[:TOP_N]:
+            lines.append(f"- {p.product}: {p.current_stock_level:,.0f} / {p.reorder_point:,.0f} / {p.current_stock_status}")
+
+    # 4. Trend deltas: last window vs the window before it
+    end = df['date'].max()
+    recent_start = end - pd.Timedelta(days=TREND_WINDOW_DAYS)
+    prior_start = recent_start - pd.Timedelta(days=TREND_WINDOW_DAYS)
+    recent = df[df['date'] > recent_start].groupby('product')['units_sold'].sum()
+    prior = df[(df['date'] > prior_start) & (df['date'] <= recent_start)].groupby('product')['units_sold'].sum()
+    delta = recent.subtract(prior, fill_value=0).sort_values()
+
+    lines.append(f"TREND (units, last {TREND_WINDOW_DAYS}d vs previous {TREND_WINDOW_DAYS}d)")
+    lines.append(f"- Overall: {recent.sum():,.0f} vs {prior.sum():,.0f}")
+    movers = pd.concat([delta.tail(TOP_N // 2)[::-1], delta.head(TOP_N // 2)])
+    movers = movers[~movers.index.duplicated()]
+    for product, change in movers.items():
+        if change != 0:
+            lines.append(f"- {product}: {change:+,.0f}")
+
+    # 5. Forecast highlights: cached per-product forecasts when available,
+    # otherwise projected from the recent run-rate
+    if forecasts is not None and not forecasts["forecast"].empty:
+        fc = forecasts["forecast"]
+        fc = fc[fc['ds'] < fc['ds'].min() + pd.Timedelta(days=PROJECTION_DAYS)]
+        projected = fc.groupby('product')['yhat'].sum().clip(lower=0)
+        source = "forecast"
+    else:
+        daily = df[df['date'] > end - pd.Timedelta(days=2 * TREND_WINDOW_DAYS)]
+        projected = daily.groupby('product')['units_sold'].sum() / (2 * TREND_WINDOW_DAYS) * PROJECTION_DAYS
+        source = "recent run-rate"
+    lines.append(f"PROJECTED DEMAND, next {PROJECTION_DAYS}d (units, {source})")
+    for product, units in projected.sort_values(ascending=False).head(TOP_N).items():
+        lines.append(f"- {product}: {units:,.0f}")
+
+    # 6. Regions
+    lines.append("TOP REGIONS (units)")
+    for r in stats.region_demand[:TOP_N]:
+        lines.append(f"- {r['region']}: {r['demand']:,}")
+
+    return _fit_to_budget(lines)
+
+def _fit_to_budget(lines: List[str], budget: int = MAX_CONTEXT_CHARS) -> str:
+    """Keeps whole lines, in order, up to `budget` characters; never cuts a line or a figure in half."""
+    kept, size = [], 0
+    for line in lines:
+        size += len(line) + (1 if kept else 0)
+        if size > budget:
+            break
+        kept.append(line)
+    # A section header with none of its lines left is noise
+    while kept and not kept[-1].startswith("- "):
+        kept.pop()
+    return "\n".join(kept)
+
+def refresh_chat_context() -> str:
+    """
+    Recomputes the summary for the current store from results already computed
+    (never fits anything). Cached only once the reorder plan exists; until then
+    the stock lines are left out and the projections use the recent run-rate.
+    """
+    version = get_data_version()
+    data = [SalesDataPoint(**record) for record in get_all_sales_data()]
+    reorder_table = peek_reorder_table()
+    forecasts = cache_get("product_forecasts", PRODUCT_HORIZON, version)
+    context = build_chat_context(data, reorder_table, forecasts)
+    if reorder_table is not None or not data:
+        cache_set("chat_context", None, version, context)
+    return context
+
+def get_chat_context() -> str:
+    """Returns the cached summary, rebuilding it only if the store changed."""
+    context = cache_get("chat_context", None, get_data_version())
+    if context is None:
+        context = refresh_chat_context()
+    return context
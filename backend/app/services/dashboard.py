@@ -1,9 +1,11 @@
 import pandas as pd
 import numpy as np
 from app.models.schemas import SalesDataPoint, DashboardStats
-from typing import List
+from typing import List, Optional
+from app.services.inventory import compute_reorder_table
 
-def get_dashboard_stats(data: List[SalesDataPoint]) -> DashboardStats:
+def get_dashboard_stats(data: List[SalesDataPoint], stock_risk_count: Optional[int] = None,
+                        accuracy: Optional[float] = None) -> DashboardStats:
     if not data:
         return DashboardStats(
             total_revenue=0,
@@ -26,17 +28,15 @@ def get_dashboard_stats(data: List[SalesDataPoint]) -> DashboardStats:
     # 2. Active Forecasts (Unique Products)
     active_forecasts = df['product'].nunique()
 
-    # 3. Avg Accuracy (Mocked for now as we don't have historical ground truth vs forecast yet)
-    # We can calculate "Forecastability" based on variance, or just return a placeholder based on data quality
-    avg_accuracy = 94.2 # Placeholder
+    # 3. Avg Accuracy: 100 - WAPE from the last backtest run (python -m app backtest)
+    # when there is one for this data; placeholder until then
+    avg_accuracy = accuracy if accuracy is not None else 94.2
 
-    # 4. Stock Risk (Items with low inventory)
-    # Define a simple threshold or use detailed logic if needed. 
-    # Here checking last inventory status per product.
-    latest_inventory = df.sort_values('date').groupby('product').tail(1)
-    
-    # Assume arbitrary safety stock threshold if not defined, e.g., < 150 units for demo purposes
-    stock_risk_count = len(latest_inventory[latest_inventory['inventory'] < 150])
+    # 4. Stock Risk (products whose latest inventory is below their reorder point)
+    # Callers holding the incrementally maintained count pass it in; otherwise derive it.
+    if stock_risk_count is None:
+        table = compute_reorder_table(df)
+        stock_risk_count = int((table['current_stock_status'] != "OK").sum())
 
     # 5. Sales Trend (Aggregated by Date)
     # Group by date and sum units_sold and revenue
@@ -100,7 +100,11 @@ def get_dashboard_stats(data: List[SalesDataPoint]) -> DashboardStats:
 
 from app.models.schemas import ProductStats
 
-def get_product_stats(data: List[SalesDataPoint], product_name: str) -> ProductStats:
+# Inventory planner status -> label shown on the product page
+STOCK_STATUS_LABELS = {"OK": "Good", "Low": "Low", "Critical": "Critical"}
+
+def get_product_stats(data: List[SalesDataPoint], product_name: str,
+                      reorder_table: Optional[pd.DataFrame] = None) -> ProductStats:
     df = pd.DataFrame([d.dict() for d in data])
     # Filter for product
     df = df[df['product'] == product_name].copy()
@@ -130,12 +134,10 @@ def get_product_stats(data: List[SalesDataPoint], product_name: str) -> ProductS
     latest_record = df.sort_values('date').iloc[-1]
     current_stock = latest_record['inventory']
     
-    # Simple status logic
-    stock_status = "Good"
-    if current_stock < 50: # Using same simplified logic or could re-use inventory service logic
-        stock_status = "Critical"
-    elif current_stock < 150:
-        stock_status = "Low"
+    # Same reorder-point rule as the inventory planner and ingest alerts
+    if reorder_table is None or product_name not in reorder_table.index:
+        reorder_table = compute_reorder_table(df)
+    stock_status = STOCK_STATUS_LABELS[reorder_table.loc[product_name, 'current_stock_status']]
         
     # Daily Trend
     daily = df.groupby('date')[['units_sold', 'revenue']].sum().reset_index().sort_values('date')
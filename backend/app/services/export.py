@@ -0,0 +1,104 @@
+import zlib
+import importlib.util
+import pandas as pd
+from typing import Iterator, Optional
+from app.services.forecasting import get_product_forecasts
+from app.services.inventory import get_inventory_plan_table, DEFAULT_PLAN_KEY
+
+# Rows written per CSV block / Parquet row group
+EXPORT_BATCH_ROWS = 100_000
+EXPORT_FORMATS = ("csv", "parquet")
+PARQUET_SUPPORT = importlib.util.find_spec("pyarrow") is not None
+
+def iter_forecast_batches(batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Per-product daily forecasts from the cached bundle, in row batches."""
+    bundle = get_product_forecasts()
+    forecast = bundle["forecast"]
+    models = bundle["model"]
+    for start in range(0, max(len(forecast), 1), batch_rows): # always at least one (maybe empty) batch
+        batch = forecast.iloc[start:start + batch_rows]
+        yield pd.DataFrame({
+            'product': batch['product'].astype(str),
+            'date': pd.to_datetime(batch['ds']).dt.strftime('%Y-%m-%d'),
+            'yhat': batch['yhat'].astype(float),
+            'yhat_lower': batch['yhat_lower'].astype(float),
+            'yhat_upper': batch['yhat_upper'].astype(float),
+            'model': batch['product'].map(models).fillna('').astype(str),
+        })
+
+def iter_plan_batches(lead_time: int = DEFAULT_PLAN_KEY[0], service_level: float = DEFAULT_PLAN_KEY[1],
+                      holding_cost: float = DEFAULT_PLAN_KEY[2], order_cost: float = DEFAULT_PLAN_KEY[3],
+                      batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Per-product inventory plans from the cached plan table, in row batches."""
+    table = get_inventory_plan_table(lead_time, service_level, holding_cost, order_cost)
+    for start in range(0, max(len(table), 1), batch_rows):
+        batch = table.iloc[start:start + batch_rows]
+        yield pd.DataFrame({
+            'product': batch.index.astype(str),
+            'reorder_point': batch['reorder_point'].astype(float),
+            'safety_stock': batch['safety_stock'].astype(float),
+            'eoq': batch['eoq'].astype(float),
+            'current_stock_level': batch['current_stock_level'].astype(float),
+            'current_stock_status': batch['current_stock_status'].astype(str),
+            'daily_demand': batch['daily_usage'].astype(float),
+            'demand_std': batch['std_dev_usage'].astype(float),
+            'lead_time': batch['lead_time'].astype(float),
+        }).reset_index(drop=True)
+
+def iter_csv_bytes(batches: Iterator[pd.DataFrame], gzip: bool = True) -> Iterator[bytes]:
+    """Encodes batches as one CSV stream (header once), gzip-compressed incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None # wbits=31 -> gzip container
+    header = True
+    for batch in batches:
+        data = batch.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+        if compressor is None:
+            yield data
+        else:
+            chunk = compressor.compress(data)
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+def write_parquet(batches: Iterator[pd.DataFrame], sink, compression: str = "zstd") -> int:
+    """Writes batches to a Parquet file/stream, one row group per batch. Returns rows written."""
+    if not PARQUET_SUPPORT:
+        raise RuntimeError("Parquet export requires pyarrow, which is not installed on the server.")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer: Optional[pq.ParquetWriter] = None
+    rows = 0
+    try:
+        for batch in batches:
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema, compression=compression)
+            writer.write_table(table)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def write_export(batches: Iterator[pd.DataFrame], fmt: str, path: str, compression: Optional[str] = None) -> int:
+    """
+    Streams an export to `path`. CSV is gzip-compressed unless compression="none";
+    Parquet defaults to zstd. Returns rows written (CSV counts as it goes).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    if fmt == "parquet":
+        return write_parquet(batches, path, compression or "zstd")
+
+    rows = 0
+    def counted():
+        nonlocal rows
+        for batch in batches:
+            rows += len(batch)
+            yield batch
+    with open(path, "wb") as f:
+        for chunk in iter_csv_bytes(counted(), gzip=(compression or "gzip") != "none"):
+            f.write(chunk)
+    return rows
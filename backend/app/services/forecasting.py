@@ -1,7 +1,13 @@
+import os
 import pandas as pd
+import numpy as np
 from prophet import Prophet
 from app.models.schemas import ForecastRequest, ForecastResult
+from app.core.cache import cached_compute, cache_peek, disk_cache_peek
+from app.core.database import get_sales_dataframe, get_data_version
+from app.core.versions import changed_products_between
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +23,15 @@ def generate_forecast(request: ForecastRequest) -> ForecastResult:
         # Aggregate by date if multiple entries per day exist
         df_agg = df.groupby('ds')['y'].sum().reset_index()
 
-        if len(df_agg) < 5:
-            # Not enough data for Prophet
-            raise ValueError("Not enough data points for forecasting. Need at least 5 days.")
+        # Too short, or too sparse for Prophet to say anything useful: cheap model instead.
+        # Daily series are judged with their missing days as zero sales.
+        series = df_agg.set_index('ds')['y']
+        if request.freq == 'D' and len(series):
+            series = series.asfreq('D', fill_value=0)
+        pattern = classify_demand(pd.DataFrame([series.to_numpy()]))['demand_class'].iloc[0]
+        if pattern not in ("smooth", "erratic"):
+            return _cheap_series_forecast(series.rename('y').rename_axis('ds').reset_index(),
+                                          request.periods, request.freq, CLASS_MODELS[pattern])
 
         # Initialize and fit model
         m = Prophet(yearly_seasonality=True, daily_seasonality=False)
@@ -45,3 +57,339 @@ def generate_forecast(request: ForecastRequest) -> ForecastResult:
     except Exception as e:
         logger.error(f"Forecasting error: {str(e)}")
         raise e
+
+def _cheap_series_forecast(df_agg: pd.DataFrame, periods: int, freq: str, method: str) -> ForecastResult:
+    """
+    Same shape as the Prophet result (history then future) from one of the cheap
+    models: in-sample one-step predictions, then a flat forecast.
+    """
+    values = df_agg['y'].to_numpy(dtype=float)
+    if method == "mean":
+        yhat = float(values.mean()) if len(values) else 0.0
+        std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+        fitted = np.full(len(values), yhat)
+    else:
+        forecast, residual_std, fitted_all = smoothing_forecasts(values[None, :], method)
+        yhat, std = float(forecast[0]), float(residual_std[0])
+        fitted = np.where(np.isnan(fitted_all[0]), values, fitted_all[0]) # no prediction yet: the actual
+
+    last = df_agg['ds'].max()
+    future_ds = pd.date_range(last, periods=periods + 1, freq=freq)[1:] if len(df_agg) else pd.DatetimeIndex([])
+    ds = pd.DatetimeIndex(df_agg['ds']).append(future_ds)
+    predicted = np.concatenate([fitted, np.full(len(future_ds), yhat)])
+    return ForecastResult(
+        ds=ds.strftime('%Y-%m-%d').tolist(),
+        yhat=predicted.tolist(),
+        yhat_lower=np.maximum(predicted - 1.28 * std, 0).tolist(),
+        yhat_upper=(predicted + 1.28 * std).tolist(),
+        trend=predicted.tolist()
+    )
+
+# --- Per-product batch forecasting ---
+
+# Days forecast ahead for every product (covers any realistic lead time)
+PRODUCT_HORIZON = 60
+# Fewer daily points than this and a product gets the mean-demand fallback
+MIN_PROPHET_POINTS = 5
+
+def daily_demand_matrix(df: pd.DataFrame, end=None) -> pd.DataFrame:
+    """
+    Units sold per product per day (all regions summed), one row per product and
+    one column per date. Days without sales inside a product's history are 0;
+    days before its first record are NaN. `end` extends the columns to a later
+    last day (e.g. the dataset's, when `df` is only a subset of products).
+    """
+    df = df.assign(date=pd.to_datetime(df['date'], errors='coerce')).dropna(subset=['date'])
+    df = df[df['product'].astype(bool)]
+    if df.empty:
+        return pd.DataFrame()
+    daily = df.groupby(['product', 'date'])['units_sold'].sum().unstack('date')
+    last = daily.columns.max() if end is None else max(daily.columns.max(), pd.Timestamp(end))
+    daily = daily.reindex(columns=pd.date_range(daily.columns.min(), last, freq='D'))
+    started = daily.notna().cumsum(axis=1) > 0
+    return daily.fillna(0).where(started)
+
+def quiet_model_logs():
+    """Silences Stan's per-fit INFO chatter (batch runs fit thousands of models)."""
+    # cmdstanpy configures its logger lazily on first use, which would undo a plain setLevel
+    from cmdstanpy.utils import get_logger
+    get_logger().setLevel(logging.WARNING)
+
+def _fit_prophet(series: pd.Series, periods: int):
+    history = series.dropna().rename('y').rename_axis('ds').reset_index()
+    # Per-product histories are often short; let Prophet decide whether yearly
+    # seasonality is identifiable instead of forcing it (which extrapolates wildly)
+    m = Prophet(yearly_seasonality='auto', daily_seasonality=False)
+    m.fit(history)
+    fc = m.predict(m.make_future_dataframe(periods=periods, freq='D'))
+    residuals = history['y'].to_numpy() - fc['yhat'].to_numpy()[:len(history)]
+    future = fc.iloc[len(history):]
+    return future[['ds', 'yhat', 'yhat_lower', 'yhat_upper']], residuals
+
+# --- Demand classification and cheap batch models ---
+
+# Syntetos-Boylan cut-offs: average inter-demand interval (days per day with
+# sales) and squared coefficient of variation of the non-zero demand sizes
+ADI_CUTOFF = 1.32
+CV2_CUTOFF = 0.49
+# Only the regular-demand products making up this share of total volume (at
+# most PROPHET_MAX_PRODUCTS, each with PROPHET_MIN_HISTORY days) get Prophet
+PROPHET_HEAD_SHARE = float(os.getenv("PROPHET_HEAD_SHARE", "0.8"))
+PROPHET_MAX_PRODUCTS = int(os.getenv("PROPHET_MAX_PRODUCTS", "200"))
+PROPHET_MIN_HISTORY = 28
+SMOOTHING_ALPHA = 0.1
+# Model for each demand class outside the Prophet head
+CLASS_MODELS = {"smooth": "ses", "erratic": "ses", "intermittent": "croston", "lumpy": "tsb", "too_short": "mean"}
+
+def classify_demand(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    ADI / CV² demand classes for every row of a daily demand matrix at once:
+    smooth, erratic, intermittent, lumpy, or too_short (fewer than
+    MIN_PROPHET_POINTS days or fewer than two days with sales). Also returns
+    each product's history length and total volume.
+    """
+    values = daily.to_numpy(dtype=float)
+    history = (~np.isnan(values)).sum(axis=1)
+    demand = values > 0 # NaN compares False
+    n_demands = demand.sum(axis=1)
+    sizes = np.where(demand, values, 0.0)
+    volume = sizes.sum(axis=1)
+
+    adi = np.divide(history, n_demands, out=np.full(len(values), np.inf), where=n_demands > 0)
+    mean = np.divide(volume, n_demands, out=np.zeros(len(values)), where=n_demands > 0)
+    mean_sq = np.divide((sizes ** 2).sum(axis=1), n_demands, out=np.zeros(len(values)), where=n_demands > 0)
+    cv2 = np.divide(np.maximum(mean_sq - mean ** 2, 0), mean ** 2, out=np.zeros(len(values)), where=mean > 0)
+
+    regular = adi < ADI_CUTOFF
+    steady = cv2 < CV2_CUTOFF
+    demand_class = np.select(
+        [(history < MIN_PROPHET_POINTS) | (n_demands < 2), regular & steady, regular, steady],
+        ["too_short", "smooth", "erratic", "intermittent"],
+        default="lumpy"
+    )
+    return pd.DataFrame({'demand_class': demand_class, 'adi': adi, 'cv2': cv2,
+                         'history_days': history, 'volume': volume}, index=daily.index)
+
+def select_head(classes: pd.DataFrame) -> set:
+    """The high-volume, regular-demand products worth a Prophet fit."""
+    total = classes['volume'].sum()
+    eligible = classes[classes['demand_class'].isin(["smooth", "erratic"])
+                       & (classes['history_days'] >= PROPHET_MIN_HISTORY)]
+    if total <= 0 or eligible.empty:
+        return set()
+    ranked = eligible['volume'].sort_values(ascending=False, kind='stable')
+    share_before = ranked.cumsum().shift(fill_value=0) / total
+    return set(ranked[share_before < PROPHET_HEAD_SHARE].index[:PROPHET_MAX_PRODUCTS])
+
+def smoothing_forecasts(values: np.ndarray, method: str, alpha: float = SMOOTHING_ALPHA):
+    """
+    Flat forecasts for many series at once (rows of `values`, NaN before each
+    series starts), stepping all of them through time together:
+
+    - ses: simple exponential smoothing of the demand
+    - croston: Croston's method with the SBA bias correction, smoothing
+      demand sizes and intervals between demands separately
+    - tsb: Teunter-Syntetos-Babai, smoothing demand size and the probability of
+      demand each day (so forecasts decay when a product stops selling)
+
+    Returns (forecast, residual std of the one-step-ahead errors, fitted), with
+    `fitted` the one-step-ahead prediction for every day (NaN where none).
+    """
+    n, T = values.shape
+    level = np.full(n, np.nan)   # ses level / croston & tsb demand size
+    rate = np.full(n, np.nan)    # croston interval / tsb probability
+    since = np.zeros(n)          # croston: days since the last demand
+    sq_err = np.zeros(n)
+    n_err = np.zeros(n)
+    fitted = np.full((n, T), np.nan)
+
+    for t in range(T):
+        y = values[:, t]
+        seen = ~np.isnan(y)
+        occurred = y > 0
+        if method == "ses":
+            pred = level
+        elif method == "croston":
+            pred = (1 - alpha / 2) * level / rate
+        else:
+            pred = rate * level
+        fitted[:, t] = pred
+        scored = seen & ~np.isnan(pred)
+        err = np.where(scored, y - pred, 0.0)
+        sq_err += err ** 2
+        n_err += scored
+
+        if method == "ses":
+            level = np.where(seen, np.where(np.isnan(level), y, level + alpha * (y - level)), level)
+        elif method == "croston":
+            since += seen
+            first = occurred & np.isnan(level)
+            level = np.where(first, y, np.where(occurred, level + alpha * (y - level), level))
+            rate = np.where(first, since, np.where(occurred, rate + alpha * (since - rate), rate))
+            since = np.where(occurred, 0.0, since)
+        else:
+            hit = occurred.astype(float)
+            rate = np.where(seen, np.where(np.isnan(rate), hit, rate + alpha * (hit - rate)), rate)
+            level = np.where(occurred, np.where(np.isnan(level), y, level + alpha * (y - level)), level)
+
+    if method == "ses":
+        forecast = level
+    elif method == "croston":
+        forecast = (1 - alpha / 2) * level / rate
+    else:
+        forecast = rate * level
+    residual_std = np.sqrt(np.divide(sq_err, n_err - 1, out=np.zeros(n), where=n_err > 1))
+    return np.nan_to_num(forecast), residual_std, fitted
+
+def _flat_forecast_frame(products, future_ds, yhat: np.ndarray, std: np.ndarray) -> pd.DataFrame:
+    periods = len(future_ds)
+    return pd.DataFrame({
+        'product': np.repeat(np.asarray(products), periods),
+        'ds': np.tile(future_ds, len(yhat)),
+        'yhat': np.repeat(yhat, periods),
+        'yhat_lower': np.repeat(np.maximum(yhat - 1.28 * std, 0), periods), # demand can't go negative
+        'yhat_upper': np.repeat(yhat + 1.28 * std, periods),
+    })
+
+def forecast_all_products(df: pd.DataFrame, periods: int = PRODUCT_HORIZON, end=None, head=None) -> dict:
+    """
+    Forecasts daily demand for every product. Products are classified by demand
+    pattern (classify_demand); the high-volume head of regular sellers is fitted
+    with Prophet and every other group with one vectorized cheap model
+    (CLASS_MODELS). Returns a bundle with
+    `forecast` (product, ds, yhat, yhat_lower, yhat_upper; future days only),
+    `residual_std` (in-sample one-step residual spread per product),
+    `model` (which model produced each product's forecast),
+    `demand_class` (each product's demand pattern) and
+    `head` (the products selected for Prophet, including any whose fit failed).
+    Pass the dataset's last date as `end` and the catalog-wide `head`
+    (select_head) when forecasting a subset of products, so every subset
+    forecasts the same days with the same model choices.
+    """
+    daily = daily_demand_matrix(df, end)
+    frames, residual_std, model = [], {}, {}
+    if daily.empty:
+        return {"forecast": pd.DataFrame(columns=['product', 'ds', 'yhat', 'yhat_lower', 'yhat_upper']),
+                "residual_std": pd.Series(dtype=float), "model": pd.Series(dtype=object),
+                "demand_class": pd.Series(dtype=object), "head": set()}
+
+    future_ds = pd.date_range(daily.columns.max() + pd.Timedelta(days=1), periods=periods, freq='D')
+    classes = classify_demand(daily)
+    head = select_head(classes) if head is None else set(head)
+    routed = classes['demand_class'].map(CLASS_MODELS)
+    routed[routed.index.isin(head)] = 'prophet'
+
+    for product, series in daily[routed == 'prophet'].iterrows():
+        try:
+            future, residuals = _fit_prophet(series, periods)
+        except Exception as e:
+            logger.error(f"Forecasting error for {product}: {str(e)}")
+            routed[product] = 'ses' # fall back to the cheap model
+            continue
+        frames.append(future.assign(product=product))
+        residual_std[product] = float(np.std(residuals, ddof=1)) if len(residuals) > 1 else 0.0
+        model[product] = 'prophet'
+
+    # Short histories: flat mean forecast, spread from the raw daily values (vectorized)
+    short = daily[routed == 'mean']
+    if not short.empty:
+        mean = short.mean(axis=1)
+        std = short.std(axis=1).fillna(0)
+        frames.append(_flat_forecast_frame(short.index, future_ds, mean.to_numpy(), std.to_numpy()))
+        residual_std.update(std.to_dict())
+        model.update({p: 'mean' for p in short.index})
+
+    # Everything else: one vectorized pass per model over all of its products
+    for method in ("ses", "croston", "tsb"):
+        group = daily[routed == method]
+        if group.empty:
+            continue
+        yhat, std, _ = smoothing_forecasts(group.to_numpy(dtype=float), method)
+        frames.append(_flat_forecast_frame(group.index, future_ds, yhat, std))
+        residual_std.update(dict(zip(group.index, std)))
+        model.update({p: method for p in group.index})
+
+    forecast = pd.concat(frames, ignore_index=True)[['product', 'ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    return {"forecast": forecast, "residual_std": pd.Series(residual_std, dtype=float),
+            "model": pd.Series(model, dtype=object), "demand_class": classes['demand_class'].astype(object),
+            "head": head & set(daily.index)}
+
+def bundle_head(bundle: dict) -> set:
+    """The products a bundle selected for Prophet (a failed fit still counts)."""
+    if "head" in bundle:
+        return set(bundle["head"])
+    # Bundles cached before the head was recorded: Prophet-fitted products only
+    return set(bundle["model"].index[bundle["model"] == 'prophet'])
+
+def merge_bundles(bundles: list) -> dict:
+    """Concatenates forecast bundles of disjoint product sets."""
+    bundles = [b for b in bundles if not b["forecast"].empty]
+    if not bundles:
+        return forecast_all_products(pd.DataFrame(columns=['date', 'product', 'units_sold']))
+    return {
+        "forecast": pd.concat([b["forecast"] for b in bundles], ignore_index=True),
+        "residual_std": pd.concat([b["residual_std"] for b in bundles]),
+        "model": pd.concat([b["model"] for b in bundles]),
+        "demand_class": pd.concat([b.get("demand_class", pd.Series(dtype=object)) for b in bundles]),
+        "head": set().union(*(bundle_head(b) for b in bundles)),
+    }
+
+def update_forecasts(bundle: dict, df: pd.DataFrame, changed: set, periods: int = PRODUCT_HORIZON) -> dict:
+    """
+    Refits only the `changed` products of an existing bundle against `df`
+    (products no longer in `df` drop out); everything else is reused as is.
+    """
+    # The Prophet head is chosen over the whole catalog; products moving in or
+    # out of it need a refit too
+    head = select_head(classify_demand(daily_demand_matrix(df)))
+    previous_head = bundle_head(bundle)
+    changed = set(changed) | (head ^ previous_head)
+
+    def unchanged(series: pd.Series) -> pd.Series:
+        return series[~series.index.isin(changed)]
+
+    kept = {
+        "forecast": bundle["forecast"][~bundle["forecast"]['product'].isin(changed)],
+        "residual_std": unchanged(bundle["residual_std"]),
+        "model": unchanged(bundle["model"]),
+        "demand_class": unchanged(bundle.get("demand_class", pd.Series(dtype=object))),
+        "head": previous_head - changed,
+    }
+    end = pd.to_datetime(df['date'], errors='coerce').max() # refits forecast the same days
+    refit = forecast_all_products(df[df['product'].isin(changed)], periods, end, head)
+    return merge_bundles([kept, refit])
+
+def _incremental_forecasts(df: pd.DataFrame, periods: int, version) -> Optional[dict]:
+    """
+    The previous bundle with only the products that changed since refitted, when
+    the dataset versions tell us which those are; None means fit from scratch.
+    """
+    previous = cache_peek("product_forecasts", periods) or disk_cache_peek("product_forecasts", periods)
+    if previous is None or previous[0] == version or previous[1]["forecast"].empty:
+        return None
+    changed = changed_products_between(previous[0], version)
+    if changed is None:
+        return None
+    # Unchanged products keep their forecasts only if the dataset still ends on
+    # the same day; a later last day shifts every product's forecast window
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    first_forecast_day = pd.Timestamp(previous[1]["forecast"]['ds'].min())
+    if dates.isna().all() or dates.max().normalize() + pd.Timedelta(days=1) != first_forecast_day:
+        return None
+    return update_forecasts(previous[1], df, changed, periods)
+
+def get_product_forecasts(periods: int = PRODUCT_HORIZON) -> dict:
+    """
+    forecast_all_products() for the stored dataset, cached per data version
+    (memory + disk). After an upload or rollback only the products whose rows
+    changed are refitted.
+    """
+    version = get_data_version()
+
+    def compute():
+        df = get_sales_dataframe()
+        bundle = _incremental_forecasts(df, periods, version)
+        return bundle if bundle is not None else forecast_all_products(df, periods)
+
+    # Persisted so CLI runs and other workers reuse the fits
+    return cached_compute("product_forecasts", periods, version, compute, persist=True)
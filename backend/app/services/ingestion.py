@@ -0,0 +1,384 @@
+import importlib.util
+import os
+import threading
+import time
+import uuid
+import datetime
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+from app.core.database import (
+    add_notification, archive_current_data, get_data_version, SALES_COLUMNS
+)
+from app.core.versions import commit_dataset, checkout_version
+from app.core.tenancy import current_tenant, submit_in_tenant
+from app.services.schema_inference import get_column_mapping
+from app.services.chat_context import refresh_chat_context
+from app.services.inventory import get_reorder_table
+from app.services.stock_alerts import update_stock_for_products
+
+# Rows per normalized chunk handed to the store
+CHUNK_SIZE = 50_000
+# Bytes read from the request body per write to the spill file
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Parsing is chunked, but an upload replaces the whole dataset: the parsed rows
+# are held in memory once to be diffed and committed as one version (the store
+# is a single snapshot). These caps bound that memory.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+MAX_UPLOAD_ROWS = int(os.getenv("MAX_UPLOAD_ROWS", "2000000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Finished jobs kept around for status queries (per tenant)
+MAX_FINISHED_JOBS = 100
+
+# Filled in once by check_dependencies() at startup, never during a request
+EXCEL_SUPPORT = {"xlsx": False, "xls": False}
+
+def check_dependencies():
+    """Detects the optional Excel readers so uploads can fail fast instead of installing them."""
+    EXCEL_SUPPORT["xlsx"] = importlib.util.find_spec("openpyxl") is not None
+    EXCEL_SUPPORT["xls"] = importlib.util.find_spec("xlrd") is not None
+    for ext, available in EXCEL_SUPPORT.items():
+        if not available:
+            print(f"WARNING: No reader installed for .{ext} files. Those uploads will be rejected.")
+    return EXCEL_SUPPORT
+
+def _normalize_headers(columns) -> List[str]:
+    # Normalize columns (strip whitespace, lowercase). Excel headers can be blank or numeric.
+    return [str(c).strip().lower() if c is not None else "" for c in columns]
+
+def _text_column(series: Optional[pd.Series], default: str, index) -> pd.Series:
+    if series is None:
+        return pd.Series(default, index=index, dtype=object)
+    missing = series.isna()
+    values = series.astype(str).str.strip()
+    missing |= (values == '') | (values.str.lower() == 'nan')
+    return values.where(~missing, default).astype(object)
+
+def _numeric_column(series: Optional[pd.Series], index) -> pd.Series:
+    if series is None:
+        return pd.Series(0.0, index=index)
+    return pd.to_numeric(series, errors='coerce').fillna(0.0).astype(float)
+
+def _count_unparseable(df: pd.DataFrame, final_cols: Dict[str, str]) -> int:
+    """Rows where a numeric column held a value that could not be parsed (and was zeroed)."""
+    bad = pd.Series(False, index=df.index)
+    for name in ('units_sold', 'price', 'inventory'):
+        if name in final_cols:
+            raw = df[final_cols[name]]
+            bad |= raw.notna() & pd.to_numeric(raw, errors='coerce').isna()
+    return int(bad.sum())
+
+def normalize_chunk(df: pd.DataFrame, final_cols: Dict[str, str], today_str: str) -> pd.DataFrame:
+    """
+    Vectorized equivalent of the old per-row loop: maps source columns onto the
+    store schema and applies the same defaults for missing/unparseable values.
+    """
+    idx = df.index
+    col = lambda name: df[final_cols[name]] if name in final_cols else None
+
+    # Date: parse where possible, keep the raw text otherwise, default to today
+    raw_date = col('date')
+    if raw_date is None:
+        date_val = pd.Series(today_str, index=idx, dtype=object)
+    else:
+        parsed = pd.to_datetime(raw_date, errors='coerce', format='mixed')
+        date_val = parsed.dt.strftime('%Y-%m-%d').astype(object)
+        unparsed = parsed.isna() & raw_date.notna()
+        date_val[unparsed] = raw_date[unparsed].astype(str).str.strip()
+        date_val[raw_date.isna()] = today_str
+
+    normalized = pd.DataFrame({
+        "date": date_val,
+        "product": _text_column(col('product'), "Unknown Product", idx),
+        "region": _text_column(col('region'), "Unknown Region", idx),
+        "units_sold": _numeric_column(col('units_sold'), idx),
+        "price": _numeric_column(col('price'), idx),
+        "inventory": _numeric_column(col('inventory'), idx),
+    }, index=idx)
+    normalized.attrs['unparseable_rows'] = _count_unparseable(df, final_cols)
+    return normalized
+
+def iter_csv_frames(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    # utf-8-sig handles the BOM Excel likes to prepend to CSV exports
+    for chunk in pd.read_csv(fileobj, chunksize=chunk_size, encoding='utf-8-sig'):
+        chunk.columns = _normalize_headers(chunk.columns)
+        yield chunk
+
+def iter_xlsx_frames(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE, sheets: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Streams an .xlsx workbook row by row (openpyxl read-only mode) instead of
+    materialising the whole workbook. Reads the first sheet unless `sheets`
+    names others; pass ["*"] for every sheet.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        if not sheets:
+            names = wb.sheetnames[:1]
+        elif sheets == ["*"]:
+            names = wb.sheetnames
+        else:
+            missing = [s for s in sheets if s not in wb.sheetnames]
+            if missing:
+                raise ValueError(f"Sheet(s) not found in workbook: {', '.join(missing)}")
+            names = sheets
+
+        for name in names:
+            rows = wb[name].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header = _normalize_headers(header)
+            buffer = []
+            for row in rows:
+                if all(v is None for v in row):
+                    continue # Skip blank rows
+                buffer.append(row)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header)
+    finally:
+        wb.close()
+
+def iter_xls_frames(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    # Legacy .xls has no streaming reader; load via xlrd and hand out chunks
+    df = pd.read_excel(fileobj, engine='xlrd')
+    df.columns = _normalize_headers(df.columns)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+def iter_normalized_chunks(fileobj: BinaryIO, filename: str, chunk_size: int = CHUNK_SIZE,
+                           sheets: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads an uploaded file chunk by chunk and yields frames already normalized
+    to the store schema (date, product, region, units_sold, price, inventory).
+    """
+    if filename.endswith('.csv'):
+        frames = iter_csv_frames(fileobj, chunk_size)
+    elif filename.endswith('.xlsx'):
+        if not EXCEL_SUPPORT["xlsx"]:
+            raise RuntimeError("Excel (.xlsx) support is not installed on the server (missing openpyxl).")
+        frames = iter_xlsx_frames(fileobj, chunk_size, sheets)
+    elif filename.endswith('.xls'):
+        if not EXCEL_SUPPORT["xls"]:
+            raise RuntimeError("Legacy Excel (.xls) support is not installed on the server (missing xlrd).")
+        frames = iter_xls_frames(fileobj, chunk_size)
+    else:
+        raise ValueError("Invalid file type. Please upload a CSV or Excel file.")
+
+    today_str = pd.Timestamp.now().strftime('%Y-%m-%d')
+    mappings: Dict[tuple, Dict[str, str]] = {}
+    for frame in frames:
+        # Decided on the first chunk of each header, so every chunk of a file maps
+        # the same way even if a later chunk's dtypes differ
+        header = tuple(frame.columns)
+        if header not in mappings:
+            mappings[header] = get_column_mapping(frame)
+        yield normalize_chunk(frame, mappings[header], today_str)
+
+# --- Background ingestion ---
+
+# Each tenant has its own FIFO queue and runs one task at a time: ingestions
+# (uploads replace its store, so they must not interleave) and the refreshes
+# that follow a data change. The shared pool serves the tenants' queue heads,
+# so one tenant's backlog can't starve the others.
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs_lock = threading.Lock()
+_jobs: Dict[str, Dict] = {}
+_queues: Dict[str, deque] = {}
+_running = set() # tenants with an ingestion on the pool
+
+def _update_job(job_id: str, **fields):
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+def _prune_jobs(tenant: str):
+    finished = [j for j in _jobs.values() if j['tenant'] == tenant and j['status'] in ('completed', 'failed')]
+    finished.sort(key=lambda j: j['created_at'])
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job['id']]
+
+def get_ingestion_status(job_id: str) -> Optional[Dict]:
+    """Status of one of the current tenant's ingestions (None for unknown or other tenants' ids)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['tenant'] != current_tenant():
+            return None
+        status = dict(job)
+    del status['tenant']
+    return status
+
+def _refresh_after_change(summary: Dict):
+    """
+    Updates what depends on the store after it moved to a new version, in the
+    background: forecasts and plans are refitted for the changed SKUs, then
+    stock alerts and the chat summary are derived from them. Queued behind the
+    tenant's ingestions, so refreshes never overlap each other or an upload.
+    """
+    _enqueue(current_tenant(), warm_inventory_plans, (summary,))
+
+def _save_records(df: pd.DataFrame, source: str = "") -> Dict:
+    """
+    Commits the parsed rows as a new dataset version (only the diff against the
+    current data is stored) and raises the usual notifications.
+    """
+    summary = commit_dataset(df, source)
+    total_rev = float((df['price'] * df['units_sold']).sum())
+    count = len(df)
+
+    if not summary["changed_products"]:
+        add_notification(
+            title="Data Upload Success",
+            message=f"Uploaded {count} records: identical to the current data, nothing changed.",
+            type="info"
+        )
+        return summary
+
+    _refresh_after_change(summary)
+
+    # Add Notification
+    add_notification(
+        title="Data Upload Success",
+        message=(f"Successfully uploaded {count} records ({summary['inserted']} new, {summary['updated']} changed, "
+                 f"{summary['deleted']} removed). Total revenue processed: ₹{total_rev:,.0f}."),
+        type="success"
+    )
+    return summary
+
+def rollback_dataset(version_id: str) -> Dict:
+    """Moves the store to an earlier (or later) dataset version and refreshes what changed."""
+    summary = checkout_version(version_id)
+    _refresh_after_change(summary)
+    add_notification(
+        title="Data Rolled Back",
+        message=f"Restored dataset version {version_id} ({len(summary['changed_products'])} products changed).",
+        type="info"
+    )
+    return summary
+
+def clear_dataset() -> Dict:
+    """Archives the data to history and commits an empty version (so it can be rolled back)."""
+    archive_current_data()
+    summary = commit_dataset(pd.DataFrame(columns=SALES_COLUMNS), "clear-data")
+    _refresh_after_change(summary)
+    return summary
+
+def warm_inventory_plans(summary: Dict):
+    """
+    Fits the per-product forecasts and the default inventory plan for the
+    current data (only the changed SKUs are refitted), so /api/inventory is a
+    cache lookup, then checks the changed SKUs' stock against the plan's reorder
+    points (the same table the dashboard counts) and refreshes the chat summary.
+    """
+    version = summary["data_version"]
+    if get_data_version() != version:
+        # A later change already landed; its own refresh sees the alert state is
+        # behind and re-evaluates every SKU, this change's included
+        return
+    try:
+        plan = get_reorder_table()
+        update_stock_for_products(plan, summary["changed_products"], summary["deleted_products"],
+                                  summary["previous_data_version"], version)
+        refresh_chat_context()
+    except Exception as e:
+        print(f"Inventory plan warm-up failed: {e}") # Computed lazily on first request instead
+
+def _run_ingestion(job_id: str, path: str, filename: str, sheets: Optional[List[str]]):
+    started = time.monotonic()
+    _update_job(job_id, status="parsing", started_at=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    try:
+        frames = []
+        rows = 0
+        unparseable = 0
+        with open(path, "rb") as fileobj:
+            for chunk in iter_normalized_chunks(fileobj, filename, sheets=sheets):
+                frames.append(chunk)
+                rows += len(chunk)
+                if rows > MAX_UPLOAD_ROWS:
+                    raise ValueError(f"File has more than {MAX_UPLOAD_ROWS:,} rows; split it into smaller uploads.")
+                unparseable += chunk.attrs.get('unparseable_rows', 0)
+                elapsed = max(time.monotonic() - started, 1e-6)
+                _update_job(job_id, rows_parsed=rows, rows_per_sec=round(rows / elapsed, 1),
+                            unparseable_rows=unparseable)
+
+        _update_job(job_id, status="saving")
+        df = pd.concat(frames, ignore_index=True) if frames else normalize_chunk(pd.DataFrame(), {}, "")
+        del frames # don't hold the rows twice while committing
+        summary = _save_records(df, filename)
+        _update_job(job_id, status="completed", dataset_version=summary["version"],
+                    inserted_rows=summary["inserted"], updated_rows=summary["updated"],
+                    deleted_rows=summary["deleted"], changed_products=len(summary["changed_products"]))
+    except Exception as e:
+        import traceback
+        error_msg = f"UPLOAD ERROR: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        with open("backend_errors.log", "a") as f:
+            f.write(error_msg + "\n----------------\n")
+        with _jobs_lock:
+            _jobs[job_id]['errors'].append(str(e))
+        _update_job(job_id, status="failed")
+    finally:
+        _update_job(job_id, elapsed_sec=round(time.monotonic() - started, 3),
+                    finished_at=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _enqueue(tenant: str, fn: Callable, args: tuple):
+    with _jobs_lock:
+        _queues.setdefault(tenant, deque()).append((fn, args))
+    _dispatch(tenant)
+
+def _dispatch(tenant: str):
+    """Starts the tenant's next queued task unless one of its tasks is already running."""
+    with _jobs_lock:
+        if tenant in _running:
+            return
+        queue = _queues.get(tenant)
+        if not queue:
+            _queues.pop(tenant, None)
+            return
+        task = queue.popleft()
+        _running.add(tenant)
+    submit_in_tenant(_executor, _run_queued, tenant, task)
+
+def _run_queued(tenant: str, task: tuple):
+    fn, args = task
+    try:
+        fn(*args)
+    finally:
+        with _jobs_lock:
+            _running.discard(tenant)
+        _dispatch(tenant)
+
+def start_ingestion(path: str, filename: str, sheets: Optional[List[str]] = None) -> str:
+    """
+    Queues a spilled upload for parsing + saving on the current tenant's
+    ingestion queue. Returns the ingestion id to poll with get_ingestion_status().
+    """
+    job_id = uuid.uuid4().hex
+    tenant = current_tenant()
+    with _jobs_lock:
+        _prune_jobs(tenant)
+        _jobs[job_id] = {
+            "id": job_id,
+            "tenant": tenant,
+            "filename": filename,
+            "status": "queued",
+            "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": None,
+            "finished_at": None,
+            "rows_parsed": 0,
+            "rows_per_sec": 0.0,
+            "unparseable_rows": 0,
+            "elapsed_sec": 0.0,
+            "errors": [],
+            "dataset_version": None,
+        }
+    _enqueue(tenant, _run_ingestion, (job_id, path, filename, sheets))
+    return job_id
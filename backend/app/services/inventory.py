@@ -1,62 +1,173 @@
 import pandas as pd
 import numpy as np
+from scipy.stats import norm
+from typing import Dict, Optional
 from app.models.schemas import InventoryRequest, InventoryPlan
+from app.core.cache import cache_get, cache_set, disk_cache_get, cached_compute
+from app.core.database import get_sales_dataframe, get_data_version
+from app.services.forecasting import forecast_all_products, get_product_forecasts
+
+# (lead_time, service_level, holding_cost, order_cost) used by the dashboard and alerts
+DEFAULT_PLAN_KEY = (5, 0.95, 0.2, 50.0)
+
+def service_level_z(service_level: float) -> float:
+    """Inverse-normal z-score for a cycle service level, e.g. 0.95 -> 1.645."""
+    if not 0 < service_level < 1:
+        raise ValueError("service_level must be between 0 and 1 (exclusive).")
+    return float(norm.ppf(service_level))
+
+def per_sku(default: float, overrides: Optional[Dict[str, float]], index: pd.Index) -> pd.Series:
+    """Broadcasts a scalar parameter over products, applying any per-product overrides."""
+    values = pd.Series(float(default), index=index)
+    if overrides:
+        known = {k: v for k, v in overrides.items() if k in index}
+        values.loc[list(known)] = list(known.values())
+    return values
+
+def stock_status(inventory: pd.Series, safety_stock: pd.Series, reorder_point: pd.Series) -> np.ndarray:
+    return np.select(
+        [inventory < safety_stock, inventory < reorder_point],
+        ["Critical", "Low"],
+        default="OK"
+    )
+
+def latest_inventory_levels(df: pd.DataFrame) -> pd.Series:
+    """Most recent inventory reading per product (ties on date keep file order)."""
+    df = df.assign(date=pd.to_datetime(df['date'], errors='coerce')).sort_values('date', kind='stable')
+    return df.groupby('product', sort=False)['inventory'].last().astype(float)
+
+def plan_from_forecasts(bundle: dict, latest_inventory: pd.Series, lead_time: int = 5,
+                        service_level: float = 0.95, holding_cost: float = 0.2, order_cost: float = 50.0,
+                        lead_times: Optional[Dict[str, float]] = None,
+                        holding_costs: Optional[Dict[str, float]] = None,
+                        order_costs: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Batch inventory planner driven by per-SKU forecasts (see forecast_all_products):
+
+    - lead-time demand = forecast demand summed over each SKU's lead time
+    - safety stock = z * residual std * sqrt(lead time), i.e. sized on forecast
+      error rather than the raw spread of sales
+    - ROP = lead-time demand + safety stock; EOQ from the forecast daily rate
+
+    All SKUs are planned in one set of array operations. This is the one
+    reorder rule: the inventory page, dashboard stock risk and stock alerts all
+    read tables produced here.
+    """
+    columns = ['reorder_point', 'safety_stock', 'current_stock_level', 'current_stock_status', 'eoq',
+               'daily_usage', 'std_dev_usage', 'lead_time']
+    z_score = service_level_z(service_level)
+    forecast = bundle["forecast"]
+    if forecast.empty:
+        return pd.DataFrame(columns=columns)
+
+    demand = forecast.pivot(index='product', columns='ds', values='yhat').sort_index(axis=1)
+    index = demand.index
+    F = np.clip(demand.fillna(0).to_numpy(), 0, None) # n_sku x horizon
+    n, horizon = F.shape
+
+    lead = per_sku(lead_time, lead_times, index)
+    holding = per_sku(holding_cost, holding_costs, index)
+    ordering = per_sku(order_cost, order_costs, index)
+    L = lead.to_numpy()
+
+    # Lead-time demand: cumulative forecast read off at each SKU's lead time
+    # (interpolating fractional days), extended at the average rate past the horizon
+    cum = np.hstack([np.zeros((n, 1)), np.cumsum(F, axis=1)])
+    rows = np.arange(n)
+    within = np.minimum(L, horizon)
+    k = np.floor(within).astype(int)
+    k_next = np.minimum(k + 1, horizon)
+    lead_time_demand = cum[rows, k] + (within - k) * (cum[rows, k_next] - cum[rows, k])
+    daily_rate = cum[:, -1] / horizon
+    lead_time_demand += np.maximum(L - horizon, 0) * daily_rate
+
+    residual_std = bundle["residual_std"].reindex(index).fillna(0).to_numpy()
+    safety_stock = pd.Series(z_score * residual_std * np.sqrt(L), index=index)
+    reorder_point = pd.Series(lead_time_demand, index=index) + safety_stock
+
+    current = latest_inventory.reindex(index).fillna(0).astype(float)
+    status = stock_status(current, safety_stock, reorder_point)
+
+    annual_demand = pd.Series(daily_rate * 365, index=index)
+    eoq = np.sqrt((2 * annual_demand * ordering) / holding.where(holding > 0)).fillna(0)
+
+    return pd.DataFrame({
+        'reorder_point': reorder_point.round(2),
+        'safety_stock': safety_stock.round(2),
+        'current_stock_level': current,
+        'current_stock_status': status,
+        'eoq': eoq.round(2),
+        'daily_usage': daily_rate,
+        'std_dev_usage': residual_std,
+        'lead_time': lead,
+    }, index=index, columns=columns)
+
+PLAN_COLUMNS = ['reorder_point', 'safety_stock', 'current_stock_level', 'current_stock_status', 'eoq']
+
+def plans_from_table(table: pd.DataFrame) -> list[InventoryPlan]:
+    return [
+        InventoryPlan(product=product, **row)
+        for product, row in zip(table.index, table[PLAN_COLUMNS].to_dict('records'))
+    ]
+
+def compute_reorder_table(df: pd.DataFrame, lead_time: int = 5, service_level: float = 0.95,
+                          holding_cost: float = 0.2, order_cost: float = 50.0,
+                          lead_times: Optional[Dict[str, float]] = None,
+                          holding_costs: Optional[Dict[str, float]] = None,
+                          order_costs: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Plan for data that isn't the stored dataset (e.g. sent with a request):
+    same rule as the stored plan, but every product is forecast with the
+    vectorized cheap models, so nothing is fitted per product. Indexed by product.
+    """
+    df = df[df['product'].astype(bool)] # Skip rows without a product name
+    bundle = forecast_all_products(df, head=())
+    return plan_from_forecasts(bundle, latest_inventory_levels(df), lead_time, service_level,
+                               holding_cost, order_cost, lead_times=lead_times,
+                               holding_costs=holding_costs, order_costs=order_costs)
 
 def calculate_inventory_metrics(request: InventoryRequest) -> list[InventoryPlan]:
+    """Plans from the caller's own data (nothing cached)."""
     df = pd.DataFrame([d.dict() for d in request.data])
-    
-    # Ensure date is datetime
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Group by product
-    products = df['product'].unique()
-    plans = []
-
-    for product in products:
-        if not product:
-            continue
-            
-        p_df = df[df['product'] == product].sort_values('date')
-        
-        # Calculate daily usage statistics
-        daily_usage = p_df['units_sold'].mean()
-        std_dev_usage = p_df['units_sold'].std() if len(p_df) > 1 else 0
-        
-        # Service Level Z-score (approximate)
-        # 0.95 -> 1.645
-        z_score = 1.645 # Default for 95%
-        
-        # Safety Stock
-        # SS = Z * std_dev * sqrt(lead_time)
-        safety_stock = z_score * std_dev_usage * np.sqrt(request.lead_time)
-        
-        # Reorder Point
-        # ROP = (Daily Usage * Lead Time) + Safety Stock
-        reorder_point = (daily_usage * request.lead_time) + safety_stock
-        
-        # Determine Current Stock Status
-        latest_inventory = p_df.iloc[-1]['inventory']
-        status = "OK"
-        if latest_inventory < reorder_point:
-            status = "Low"
-        if latest_inventory < safety_stock:
-            status = "Critical"
-
-        # Simple EOQ
-        # EOQ = sqrt(2 * Demand * OrderCost / HoldingCost)
-        # Annual Demand approx
-        annual_demand = daily_usage * 365
-        order_cost = 50 # Assumed fixed ordering cost
-        eoq = np.sqrt((2 * annual_demand * order_cost) / request.holding_cost) if request.holding_cost > 0 else 0
-
-        plan = InventoryPlan(
-            product=product,
-            reorder_point=round(reorder_point, 2),
-            safety_stock=round(safety_stock, 2),
-            current_stock_level=float(latest_inventory),
-            current_stock_status=status,
-            eoq=round(eoq, 2)
-        )
-        plans.append(plan)
-        
-    return plans
+    table = compute_reorder_table(df, request.lead_time, request.service_level,
+                                  request.holding_cost, request.order_cost)
+    return plans_from_table(table)
+
+def get_inventory_plan_table(lead_time: int = 5, service_level: float = 0.95,
+                             holding_cost: float = 0.2, order_cost: float = 50.0,
+                             persist: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Forecast-driven plan for the stored dataset, cached per data version and
+    parameter set alongside the forecasts it came from. Only the default
+    parameter set is written to disk unless `persist` says otherwise: the
+    parameters come from request/query params, and every distinct set would
+    otherwise leave a file behind.
+    """
+    key = (lead_time, service_level, holding_cost, order_cost)
+    if persist is None:
+        persist = key == DEFAULT_PLAN_KEY
+
+    def compute():
+        bundle = get_product_forecasts()
+        df = get_sales_dataframe()
+        return plan_from_forecasts(bundle, latest_inventory_levels(df), *key)
+
+    return cached_compute("inventory_plan", key, get_data_version(), compute, persist=persist)
+
+def get_reorder_table() -> pd.DataFrame:
+    """
+    Reorder-point table for the stored dataset with default parameters, shared by
+    stock alerts, the dashboard, product stats and the chat context: the
+    forecast-driven plan, so every consumer sees the same statuses.
+    """
+    return get_inventory_plan_table(*DEFAULT_PLAN_KEY)
+
+def peek_reorder_table() -> Optional[pd.DataFrame]:
+    """get_reorder_table() if it is already computed (memory or disk), else None; never fits anything."""
+    version = get_data_version()
+    table = cache_get("inventory_plan", DEFAULT_PLAN_KEY, version)
+    if table is None:
+        table = disk_cache_get("inventory_plan", DEFAULT_PLAN_KEY, version)
+        if table is not None:
+            cache_set("inventory_plan", DEFAULT_PLAN_KEY, version, table)
+    return table
@@ -0,0 +1,127 @@
+import re
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from app.core.tenancy import current_tenant
+
+# target_col: [list of potential aliases], strongest first
+COLUMN_MAPPING = {
+    'date': ['date', 'txn_date', 'transaction_date', 'period', 'day', 'time'],
+    'product': ['product', 'product_name', 'sku', 'item', 'model', 'name'],
+    'region': ['region', 'location', 'area', 'zone', 'city', 'state', 'country', 'store'],
+    'units_sold': ['units_sold', 'units', 'quantity', 'qty', 'sold', 'demand', 'volume', 'sales'],
+    'price': ['price', 'unit_price', 'selling_price', 'cost', 'amount', 'value', 'revenue'],
+    'inventory': ['inventory', 'stock_level', 'stock', 'on_hand', 'qty_on_hand']
+}
+
+SAMPLE_ROWS = 500
+# Candidates scoring below this are ignored (column left unmapped)
+MIN_SCORE = 0.2
+MAX_CACHED_MAPPINGS = 256
+
+_cache_lock = threading.Lock()
+_mapping_cache: "OrderedDict[Tuple, Dict[str, str]]" = OrderedDict()
+
+def _tokens(name: str) -> List[str]:
+    return [t for t in re.split(r'[^a-z0-9]+', name.lower()) if t]
+
+def _name_score(column: str, aliases: List[str]) -> float:
+    """
+    How well a header matches a target's aliases: exact > whole tokens > substring,
+    with earlier (stronger) aliases worth slightly more.
+    """
+    col_tokens = _tokens(column)
+    joined = "_".join(col_tokens)
+    best = 0.0
+    for rank, alias in enumerate(aliases):
+        alias_tokens = _tokens(alias)
+        n = len(alias_tokens)
+        if joined == alias:
+            score = 1.0
+        elif any(col_tokens[i:i + n] == alias_tokens for i in range(len(col_tokens) - n + 1)):
+            # Whole-token hit; diluted by any extra tokens in the header
+            score = 0.8 * n / len(col_tokens) + 0.1
+        elif alias in joined:
+            score = 0.3
+        else:
+            continue
+        best = max(best, score - 0.02 * rank)
+    return best
+
+def _value_score(target: str, values: pd.Series) -> float:
+    """Fraction (0..1) of sampled values that look like what the target column holds."""
+    values = values.dropna()
+    if values.empty:
+        return 0.5 # No evidence either way
+    numeric = pd.to_numeric(values, errors='coerce')
+    numeric_frac = numeric.notna().mean()
+
+    if target == 'date':
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return 1.0
+        if numeric_frac > 0.5:
+            return 0.1 # Plain numbers are rarely dates (day-of-week, ids...)
+        parsed = pd.to_datetime(values.astype(str), errors='coerce', format='mixed')
+        return float(parsed.notna().mean())
+
+    if target in ('product', 'region'):
+        return float(1.0 - numeric_frac * 0.7) # Codes can be numeric, but names usually aren't
+
+    if numeric_frac == 0:
+        return 0.0
+    numeric = numeric.dropna()
+    non_negative = (numeric >= 0).mean()
+    integral = (numeric == numeric.round()).mean()
+    if target in ('units_sold', 'inventory'):
+        # Counts: numeric, non-negative, mostly whole numbers
+        return float(numeric_frac * non_negative * (0.6 + 0.4 * integral))
+    # price: numeric and non-negative; fractional values are a mild signal
+    return float(numeric_frac * non_negative * (0.8 + 0.2 * (1 - integral)))
+
+def infer_column_mapping(sample: pd.DataFrame) -> Dict[str, str]:
+    """
+    Scores every (target, column) pair on header name and sampled values, then
+    assigns greedily from the best score down so each column is used at most once.
+    Ties resolve by target order, then column position, so results are deterministic.
+    """
+    sample = sample.head(SAMPLE_ROWS)
+    candidates = []
+    for t_idx, (target, aliases) in enumerate(COLUMN_MAPPING.items()):
+        for c_idx, column in enumerate(sample.columns):
+            name_score = _name_score(column, aliases)
+            if name_score <= 0:
+                continue
+            score = name_score * (0.4 + 0.6 * _value_score(target, sample.iloc[:, c_idx]))
+            if score >= MIN_SCORE:
+                candidates.append((-round(score, 6), t_idx, c_idx, target, column))
+
+    final_cols: Dict[str, str] = {}
+    used = set()
+    for _, _, c_idx, target, column in sorted(candidates):
+        if target in final_cols or c_idx in used:
+            continue
+        final_cols[target] = column
+        used.add(c_idx)
+    return final_cols
+
+def get_column_mapping(sample: pd.DataFrame) -> Dict[str, str]:
+    """
+    Cached infer_column_mapping(): a tenant's feeds with the same header and
+    column dtypes reuse the mapping found for the first file and skip
+    inference. Keyed by tenant because the mapping also depends on sampled
+    values, so one tenant's file mustn't decide another's.
+    """
+    signature = (current_tenant(), tuple(sample.columns), tuple(str(dtype) for dtype in sample.dtypes))
+    with _cache_lock:
+        if signature in _mapping_cache:
+            _mapping_cache.move_to_end(signature)
+            return _mapping_cache[signature]
+
+    mapping = infer_column_mapping(sample)
+
+    with _cache_lock:
+        _mapping_cache[signature] = mapping
+        if len(_mapping_cache) > MAX_CACHED_MAPPINGS:
+            _mapping_cache.popitem(last=False)
+    return mapping
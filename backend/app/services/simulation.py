@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from app.models.schemas import WhatIfRequest, WhatIfResult
+from app.core.database import get_sales_dataframe
+from app.services.forecasting import forecast_all_products, get_product_forecasts
+from app.services.inventory import plan_from_forecasts, latest_inventory_levels
+
+# Upper bound on simulated cells (SKUs x paths x pipeline slots) held at once
+MAX_CELLS_PER_CHUNK = 16_000_000
+
+def simulate_sq_policies(mean_demand: np.ndarray, std_demand: np.ndarray,
+                         reorder_point: np.ndarray, order_qty: np.ndarray,
+                         lead_time: np.ndarray, initial_stock: np.ndarray,
+                         n_paths: int = 1000, horizon: int = 90,
+                         seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Monte Carlo simulation of continuous-review (s, Q) policies with lost sales,
+    for all SKUs at once. Each input is one value per SKU; the state is a
+    (SKU x path) array advanced one day at a time.
+
+    Each day: due orders arrive, demand ~ max(0, Normal(mean, std)) is served
+    from stock, and whenever the inventory position (on hand + on order) is at or
+    below s, enough multiples of Q are ordered to lift it back above s. Orders
+    arrive `lead_time` days later (at least one day).
+
+    Returns per-SKU fill rate, stockout probability (share of days with unmet
+    demand), average on-hand stock and orders placed per day.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(mean_demand)
+    mu = np.asarray(mean_demand, dtype=np.float32)[:, None]
+    sigma = np.asarray(std_demand, dtype=np.float32)[:, None]
+    s = np.asarray(reorder_point, dtype=np.float32)[:, None]
+    q = np.maximum(np.asarray(order_qty, dtype=np.float32), 1.0)[:, None] # Q = 0 would never restock
+    lead = np.clip(np.rint(lead_time), 1, None).astype(np.int64)
+    slots = int(lead.max(initial=1)) + 1
+
+    on_hand = np.repeat(np.asarray(initial_stock, dtype=np.float32)[:, None], n_paths, axis=1)
+    on_order = np.zeros((n, n_paths), dtype=np.float32)
+    pipeline = np.zeros((slots, n, n_paths), dtype=np.float32) # ring buffer of arrivals by day
+    rows = np.arange(n)
+
+    served = np.zeros(n, dtype=np.float64)
+    demanded = np.zeros(n, dtype=np.float64)
+    stockout_days = np.zeros(n, dtype=np.float64)
+    on_hand_total = np.zeros(n, dtype=np.float64)
+    orders = np.zeros(n, dtype=np.float64)
+
+    for t in range(horizon):
+        # Receive today's arrivals
+        slot = t % slots
+        arriving = pipeline[slot]
+        on_hand += arriving
+        on_order -= arriving
+        arriving[:] = 0
+
+        # Serve demand; anything beyond stock is lost. Common random numbers: every
+        # SKU sees the same standard-normal shock per path, which leaves each SKU's
+        # estimates unbiased and avoids drawing SKUs x paths variates per day.
+        shock = rng.standard_normal(n_paths, dtype=np.float32)
+        demand = sigma * shock
+        demand += mu
+        np.maximum(demand, 0, out=demand)
+        sales = np.minimum(on_hand, demand)
+        on_hand -= sales
+
+        served += sales.sum(axis=1)
+        demanded += demand.sum(axis=1)
+        stockout_days += (demand > sales).sum(axis=1)
+        on_hand_total += on_hand.sum(axis=1)
+
+        # Reorder: smallest number of Qs that lifts the position above s
+        position = on_hand + on_order
+        n_orders = np.floor((s - position) / q)
+        n_orders += 1
+        n_orders *= position <= s
+        qty = n_orders * q
+        on_order += qty
+        pipeline[(t + lead) % slots, rows] += qty
+        orders += n_orders.sum(axis=1)
+
+    cells = horizon * n_paths
+    return {
+        "fill_rate": np.divide(served, demanded, out=np.ones(n), where=demanded > 0),
+        "stockout_probability": stockout_days / cells,
+        "avg_on_hand": on_hand_total / cells,
+        "orders_per_day": orders / cells,
+    }
+
+def run_what_if(request: WhatIfRequest) -> List[WhatIfResult]:
+    """
+    Builds (s, Q) policies from the forecast-driven plan for the requested service
+    level, lead times and costs, then simulates them to estimate the service achieved.
+    Demand is simulated from each product's forecast rate and forecast error.
+    """
+    if request.data:
+        df = pd.DataFrame([d.dict() for d in request.data])
+        # Caller's data: vectorized cheap models only, nothing fitted per product
+        bundle = forecast_all_products(df, head=())
+    else:
+        # Stored data: reuse the cached per-product forecasts
+        df = get_sales_dataframe()
+        bundle = get_product_forecasts()
+    table = plan_from_forecasts(
+        bundle, latest_inventory_levels(df), request.lead_time, request.service_level,
+        request.holding_cost, request.order_cost,
+        lead_times=request.lead_times, holding_costs=request.holding_costs, order_costs=request.order_costs
+    )
+    if request.products:
+        table = table[table.index.isin(request.products)]
+    if table.empty:
+        return []
+
+    # Bounds (1..MAX_PATHS, 1..MAX_HORIZON) are enforced on the request
+    n_paths, horizon = request.n_paths, request.horizon
+    rng = np.random.default_rng(request.seed)
+
+    # Chunk SKUs so memory stays bounded however large the catalog is
+    slots = int(table['lead_time'].max()) + 4 # pipeline + working arrays
+    chunk = max(1, MAX_CELLS_PER_CHUNK // (n_paths * slots))
+    results = []
+    for start in range(0, len(table), chunk):
+        part = table.iloc[start:start + chunk]
+        sim = simulate_sq_policies(
+            part['daily_usage'].to_numpy(), part['std_dev_usage'].to_numpy(),
+            part['reorder_point'].to_numpy(), part['eoq'].to_numpy(),
+            part['lead_time'].to_numpy(), part['current_stock_level'].to_numpy(),
+            n_paths=n_paths, horizon=horizon, seed=rng.integers(2**63)
+        )
+        for i, (product, row) in enumerate(part.iterrows()):
+            results.append(WhatIfResult(
+                product=product,
+                reorder_point=row['reorder_point'],
+                order_quantity=max(row['eoq'], 1.0),
+                safety_stock=row['safety_stock'],
+                lead_time=row['lead_time'],
+                fill_rate=round(float(sim['fill_rate'][i]), 4),
+                stockout_probability=round(float(sim['stockout_probability'][i]), 4),
+                avg_on_hand=round(float(sim['avg_on_hand'][i]), 2),
+            ))
+    return results
@@ -0,0 +1,117 @@
+import threading
+import pandas as pd
+from typing import Dict, Iterable
+from app.core.database import add_notification, get_data_version
+from app.core.tenancy import current_tenant, register_eviction_hook
+from app.services.inventory import get_reorder_table
+
+AT_RISK = ("Low", "Critical")
+# Up to this many newly at-risk SKUs get an alert each; a bigger wave is
+# summarised in one alert instead of flooding the notification feed
+MAX_SKU_ALERTS = 5
+
+# Per tenant: last known status per SKU plus the running at-risk count, tied to a data version
+_lock = threading.Lock()
+_states: Dict[str, Dict] = {}
+
+def _tenant_state() -> Dict:
+    with _lock:
+        return _states.setdefault(current_tenant(), {"version": None, "status": {}, "risk_count": 0})
+
+# Idle tenants: rebuilt from the store on their next request
+register_eviction_hook(lambda tenant: _states.pop(tenant, None))
+
+def apply_stock_updates(updates: pd.DataFrame, removed: Iterable[str] = (), version=None, notify: bool = True) -> Dict:
+    """
+    Folds re-evaluated SKUs (rows of a reorder table) into the stock-risk state.
+    Only rows whose status changed are touched, so the cost is O(changed SKUs).
+    Alerts are raised for SKUs that newly became Low/Critical.
+    """
+    statuses = updates['current_stock_status']
+    state = _tenant_state()
+    with _lock:
+        status: Dict[str, str] = state["status"]
+        # Vectorized filter down to the SKUs whose status actually moved
+        previous = pd.Series(status, dtype=object).reindex(statuses.index, fill_value="OK")
+        changed = statuses[statuses.values != previous.values]
+
+        newly_at_risk = []
+        for product, new in changed.items():
+            old = status.get(product, "OK")
+            state["risk_count"] += (new in AT_RISK) - (old in AT_RISK)
+            if new in AT_RISK and old not in AT_RISK:
+                newly_at_risk.append((product, new))
+            if new == "OK":
+                status.pop(product, None)
+            else:
+                status[product] = new
+
+        for product in removed:
+            if status.pop(product, "OK") in AT_RISK:
+                state["risk_count"] -= 1
+
+        state["version"] = version
+        at_risk = {p: v for p, v in status.items() if v in AT_RISK} if len(newly_at_risk) > MAX_SKU_ALERTS else {}
+
+    if notify and newly_at_risk:
+        # Critical first, then the rest
+        newly_at_risk.sort(key=lambda x: x[1] != "Critical")
+        if len(newly_at_risk) <= MAX_SKU_ALERTS:
+            # Keyed per SKU: a repeat alert replaces that SKU's unread one, other SKUs' stay
+            for product, new in newly_at_risk:
+                add_notification(
+                    title="Inventory Alert",
+                    message=f"Stock below reorder point for: {product} ({new})",
+                    type="warning",
+                    dedup_key=f"stock:{product}"
+                )
+        else:
+            # The summary replaces the previous unread one, so it lists every SKU
+            # still at risk, not just this wave
+            wave = {p for p, _ in newly_at_risk}
+            names = sorted(at_risk, key=lambda p: (at_risk[p] != "Critical", p not in wave))
+            limited_list = ", ".join(names[:3])
+            more_count = len(names) - 3
+            add_notification(
+                title="Inventory Alert",
+                message=f"Stock below reorder point for: {limited_list} and {more_count} others.",
+                type="warning",
+                dedup_key="stock:summary"
+            )
+    return {"changed": len(changed), "newly_at_risk": len(newly_at_risk)}
+
+def replace_stock_table(table: pd.DataFrame, version=None, notify: bool = True) -> Dict:
+    """Evaluates a full reorder table (e.g. after a clean-slate upload) against the state."""
+    state = _tenant_state()
+    with _lock:
+        removed = [p for p in state["status"] if p not in table.index]
+    return apply_stock_updates(table, removed, version, notify)
+
+def update_stock_for_products(table: pd.DataFrame, products: Iterable[str], removed: Iterable[str],
+                              previous_version, version, notify: bool = True) -> Dict:
+    """
+    Re-evaluates only `products` (those whose rows changed) if the state is for
+    `previous_version`, the store state the change started from; otherwise
+    falls back to the whole table.
+    """
+    if _tenant_state()["version"] != previous_version:
+        return replace_stock_table(table, version, notify)
+    return apply_stock_updates(table[table.index.isin(set(products))], removed, version, notify)
+
+def get_stock_risk_count() -> int:
+    """
+    Number of SKUs whose latest inventory is below their reorder point. Maintained
+    incrementally by the post-ingest refresh. If the store moved on and that
+    refresh hasn't run yet, the count is read straight off the current plan
+    without touching the state, so the refresh still raises its alerts.
+    """
+    version = get_data_version()
+    state = _tenant_state()
+    if state["version"] == version:
+        return state["risk_count"]
+    table = get_reorder_table()
+    if state["version"] is None:
+        # Nothing tracked yet (fresh process): the current plan is the baseline
+        replace_stock_table(table, version, notify=False)
+        return state["risk_count"]
+    return int(table['current_stock_status'].isin(AT_RISK).sum())
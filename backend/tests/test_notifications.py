@@ -0,0 +1,48 @@
+import pandas as pd
+from app.core.notifications import NotificationEngine
+from app.core import database
+from app.services import stock_alerts
+
+def _table(statuses):
+    return pd.DataFrame({"current_stock_status": statuses}).rename_axis("product")
+
+def test_dedup_key_replaces_only_matching_unread(tmp_path):
+    engine = NotificationEngine(str(tmp_path / "notifications.json"))
+    engine.add("Inventory Alert", "P1 low", "warning", dedup_key="stock:P1")
+    engine.add("Inventory Alert", "P2 low", "warning", dedup_key="stock:P2")
+    engine.add("Inventory Alert", "P1 critical", "warning", dedup_key="stock:P1")
+
+    messages = [n["message"] for n in engine.get_all()]
+    assert messages == ["P1 critical", "P2 low"]
+
+    # Read alerts are history: a new alert for the same key stacks on top
+    engine.mark_all_read()
+    engine.add("Inventory Alert", "P1 low again", "warning", dedup_key="stock:P1")
+    assert len(engine.get_all()) == 3
+
+def test_stock_alerts_for_different_products_stay_separate(tmp_path, monkeypatch):
+    # Absolute path: the engine outlives the test and flushes on exit
+    monkeypatch.setattr(database, "NOTIFICATIONS_FILE", str(tmp_path / "notifications.json"))
+    monkeypatch.setattr(stock_alerts, "_states", {})
+
+    stock_alerts.apply_stock_updates(_table({"P1": "Low", "P2": "OK"}))
+    stock_alerts.apply_stock_updates(_table({"P2": "Critical"}))
+
+    alerts = [n for n in database.get_notifications() if n["title"] == "Inventory Alert"]
+    assert sorted(n["dedup_key"] for n in alerts) == ["stock:P1", "stock:P2"]
+    assert any("P1" in n["message"] for n in alerts)
+    assert any("P2" in n["message"] for n in alerts)
+
+def test_stock_alert_summary_keeps_skus_still_at_risk(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "NOTIFICATIONS_FILE", str(tmp_path / "notifications.json"))
+    monkeypatch.setattr(stock_alerts, "_states", {})
+    monkeypatch.setattr(stock_alerts, "MAX_SKU_ALERTS", 2)
+
+    stock_alerts.apply_stock_updates(_table({"P1": "Critical", "P2": "Low", "P3": "Low"}))
+    stock_alerts.apply_stock_updates(_table({"P4": "Low", "P5": "Low", "P6": "Low"}))
+
+    alerts = [n for n in database.get_notifications() if n["title"] == "Inventory Alert"]
+    assert len(alerts) == 1
+    # Second wave's summary replaced the first, but still counts all six SKUs
+    assert alerts[0]["message"].startswith("Stock below reorder point for: P1, ")
+    assert alerts[0]["message"].endswith("and 3 others.")
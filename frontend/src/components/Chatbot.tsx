@@ -23,16 +23,8 @@ export function Chatbot() {
         setIsLoading(true);
 
         try {
-            // Get context from localStorage
-            const storedData = localStorage.getItem('salesData');
-            let context = "";
-            if (storedData) {
-                // Summarize context to avoid token limits
-                const data = JSON.parse(storedData).slice(0, 50); // Limit to top 50 rows for context
-                context = JSON.stringify(data);
-            }
-
-            const data = await api.chat(userMsg, context);
+            // The backend attaches its own cached summary of the uploaded data
+            const data = await api.chat(userMsg, "");
             setMessages(prev => [...prev, { role: 'bot', text: data.response }]);
         } catch (error) {
             setMessages(prev => [...prev, { role: 'bot', text: 'Sorry, I encounted an error. Please try again.' }]);
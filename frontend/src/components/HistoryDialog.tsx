@@ -1,6 +1,6 @@
 import { Dialog, Transition } from '@headlessui/react';
 import { Fragment, useState, useEffect } from 'react';
-import { X, Database, Loader2, Calendar, ChevronRight, ArrowLeft } from 'lucide-react';
+import { X, Database, Loader2, Calendar, ChevronRight, ArrowLeft, RotateCcw } from 'lucide-react';
 import { api } from '../services/api';
 
 interface HistoryDialogProps {
@@ -16,10 +16,25 @@ interface HistoryBatch {
     records: any[];
 }
 
+interface DatasetVersion {
+    id: string;
+    created_at: string;
+    source: string;
+    record_count: number;
+    total_revenue: number;
+    inserted: number;
+    updated: number;
+    deleted: number;
+    head: boolean;
+}
+
 export function HistoryDialog({ isOpen, onClose }: HistoryDialogProps) {
+    const [tab, setTab] = useState<'versions' | 'archived'>('versions');
+    const [versions, setVersions] = useState<DatasetVersion[]>([]);
     const [batches, setBatches] = useState<HistoryBatch[]>([]);
     const [selectedBatch, setSelectedBatch] = useState<HistoryBatch | null>(null);
     const [loading, setLoading] = useState(false);
+    const [restoring, setRestoring] = useState<string | null>(null);
     const [error, setError] = useState('');
 
     useEffect(() => {
@@ -33,7 +48,9 @@ export function HistoryDialog({ isOpen, onClose }: HistoryDialogProps) {
         setLoading(true);
         setError('');
         try {
-            const historyData = await api.getHistory();
+            // Uploads are recorded as dataset versions; clearing data also archives a batch
+            const [versionData, historyData] = await Promise.all([api.getVersions(), api.getHistory()]);
+            setVersions(versionData);
             setBatches(historyData);
         } catch (err) {
             console.error("Failed to fetch history", err);
@@ -43,6 +60,22 @@ export function HistoryDialog({ isOpen, onClose }: HistoryDialogProps) {
         }
     };
 
+    const restoreVersion = async (version: DatasetVersion) => {
+        if (!confirm(`Restore the dataset as of ${version.created_at}? Forecasts and stock alerts will be refreshed.`)) {
+            return;
+        }
+        setRestoring(version.id);
+        try {
+            await api.rollbackVersion(version.id);
+            // Every page reads the restored data from the server
+            window.location.reload();
+        } catch (err: any) {
+            console.error("Failed to restore version", err);
+            alert(err.response?.data?.detail || 'Failed to restore this version.');
+            setRestoring(null);
+        }
+    };
+
     return (
         <Transition appear show={isOpen} as={Fragment}>
             <Dialog as="div" className="relative z-50" onClose={onClose}>
@@ -87,7 +120,7 @@ export function HistoryDialog({ isOpen, onClose }: HistoryDialogProps) {
                                                 <span>Session Details: {selectedBatch.archived_at}</span>
                                             </div>
                                         ) : (
-                                            "Archived Data History"
+                                            "Data History"
                                         )}
                                     </Dialog.Title>
                                     <button
@@ -109,7 +142,92 @@ export function HistoryDialog({ isOpen, onClose }: HistoryDialogProps) {
                                     </div>
                                 ) : (
                                     <div className="flex-1 overflow-hidden flex flex-col">
-                                        {!selectedBatch ? (
+                                        {!selectedBatch && (
+                                            <div className="flex gap-2 mb-4 shrink-0">
+                                                {(['versions', 'archived'] as const).map((t) => (
+                                                    <button
+                                                        key={t}
+                                                        onClick={() => setTab(t)}
+                                                        className={`px-3 py-1.5 rounded-md text-sm font-medium transition-colors ${tab === t ? 'bg-primary text-primary-foreground' : 'bg-slate-100 text-slate-700 hover:bg-slate-200'}`}
+                                                    >
+                                                        {t === 'versions' ? 'Dataset Versions' : 'Archived Data'}
+                                                    </button>
+                                                ))}
+                                            </div>
+                                        )}
+                                        {!selectedBatch && tab === 'versions' ? (
+                                            <div className="overflow-auto border rounded-lg">
+                                                <table className="w-full text-sm text-left">
+                                                    <thead className="text-xs text-gray-700 uppercase bg-gray-50 sticky top-0">
+                                                        <tr>
+                                                            <th className="px-6 py-3">Created</th>
+                                                            <th className="px-6 py-3">Source</th>
+                                                            <th className="px-6 py-3 text-right">Records Count</th>
+                                                            <th className="px-6 py-3 text-right">Total Revenue</th>
+                                                            <th className="px-6 py-3 text-right">Changes</th>
+                                                            <th className="px-6 py-3 text-center">Action</th>
+                                                        </tr>
+                                                    </thead>
+                                                    <tbody>
+                                                        {versions.length === 0 ? (
+                                                            <tr>
+                                                                <td colSpan={6} className="px-6 py-12 text-center text-muted-foreground">
+                                                                    <div className="flex flex-col items-center gap-2">
+                                                                        <Calendar className="h-8 w-8 opacity-20" />
+                                                                        <p>No versions yet.</p>
+                                                                        <p className="text-xs">Each upload that changes the data is recorded here.</p>
+                                                                    </div>
+                                                                </td>
+                                                            </tr>
+                                                        ) : (
+                                                            versions.map((version) => (
+                                                                <tr key={version.id} className="bg-white border-b hover:bg-gray-50 transition-colors">
+                                                                    <td className="px-6 py-4 font-medium text-gray-900 whitespace-nowrap">
+                                                                        {version.created_at}
+                                                                    </td>
+                                                                    <td className="px-6 py-4 max-w-[14rem] truncate" title={version.source}>
+                                                                        {version.source}
+                                                                    </td>
+                                                                    <td className="px-6 py-4 text-right">
+                                                                        <span className="bg-slate-100 text-slate-700 px-2 py-1 rounded text-xs font-semibold">
+                                                                            {version.record_count} Records
+                                                                        </span>
+                                                                    </td>
+                                                                    <td className="px-6 py-4 text-right font-medium text-emerald-600">
+                                                                        ₹{version.total_revenue.toLocaleString()}
+                                                                    </td>
+                                                                    <td className="px-6 py-4 text-right text-xs whitespace-nowrap">
+                                                                        <span className="text-green-700">+{version.inserted}</span>{' '}
+                                                                        <span className="text-amber-700">~{version.updated}</span>{' '}
+                                                                        <span className="text-red-700">-{version.deleted}</span>
+                                                                    </td>
+                                                                    <td className="px-6 py-4 text-center">
+                                                                        {version.head ? (
+                                                                            <span className="bg-blue-100 text-blue-800 text-xs font-medium px-2.5 py-0.5 rounded">
+                                                                                Current
+                                                                            </span>
+                                                                        ) : (
+                                                                            <button
+                                                                                onClick={() => restoreVersion(version)}
+                                                                                disabled={restoring !== null}
+                                                                                className="text-primary hover:text-primary/80 font-medium text-xs flex items-center justify-center gap-1 mx-auto disabled:opacity-50"
+                                                                            >
+                                                                                {restoring === version.id ? (
+                                                                                    <Loader2 className="h-3 w-3 animate-spin" />
+                                                                                ) : (
+                                                                                    <RotateCcw className="h-3 w-3" />
+                                                                                )}
+                                                                                Restore
+                                                                            </button>
+                                                                        )}
+                                                                    </td>
+                                                                </tr>
+                                                            ))
+                                                        )}
+                                                    </tbody>
+                                                </table>
+                                            </div>
+                                        ) : !selectedBatch ? (
                                             <div className="overflow-auto border rounded-lg">
                                                 <table className="w-full text-sm text-left">
                                                     <thead className="text-xs text-gray-700 uppercase bg-gray-50 sticky top-0">
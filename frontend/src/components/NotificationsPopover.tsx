@@ -15,21 +15,25 @@ export function NotificationsPopover({ onClose }: { onClose: () => void }) {
     const [notifications, setNotifications] = useState<Notification[]>([]);
 
     useEffect(() => {
-        loadNotifications();
-        // Optional: Poll every 10s
-        const interval = setInterval(loadNotifications, 10000);
-        return () => clearInterval(interval);
+        // Long-poll: the server answers as soon as something changes (or after ~25s)
+        let active = true;
+        const listen = async () => {
+            let seq = -1;
+            while (active) {
+                try {
+                    const data = await api.pollNotifications(seq);
+                    seq = data.seq;
+                    if (active) setNotifications(data.notifications);
+                } catch (e) {
+                    console.error("Failed to load notifications", e);
+                    await new Promise(resolve => setTimeout(resolve, 10000));
+                }
+            }
+        };
+        listen();
+        return () => { active = false; };
     }, []);
 
-    const loadNotifications = async () => {
-        try {
-            const data = await api.getNotifications();
-            setNotifications(data);
-        } catch (e) {
-            console.error("Failed to load notifications", e);
-        }
-    };
-
     const markAllRead = async () => {
         try {
             await api.markNotificationsRead();
@@ -39,9 +39,19 @@ export function Upload() {
         setError(null);
 
         try {
-            const data = await api.uploadData(file);
-            // Store data in localStorage for demo simplicity
-            localStorage.setItem('salesData', JSON.stringify(data));
+            const { ingestion_id } = await api.uploadData(file);
+
+            // Parsing runs in the background; poll until the ingestion finishes
+            let status = await api.getUploadStatus(ingestion_id);
+            while (status.status !== 'completed' && status.status !== 'failed') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                status = await api.getUploadStatus(ingestion_id);
+            }
+            if (status.status === 'failed') {
+                setError(`Processing Error: ${status.errors.join('; ')}`);
+                return;
+            }
+
             setSuccess(true);
             setTimeout(() => navigate('/forecast'), 1500);
         } catch (err: any) {
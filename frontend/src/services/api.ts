@@ -19,6 +19,10 @@ export const api = {
         return res.data;
     },
 
+    getUploadStatus: async (ingestionId: string) => {
+        return (await axiosInstance.get(`/upload/${ingestionId}`)).data;
+    },
+
     getForecast: async () => {
         return (await axiosInstance.post('/forecast', { data: [] })).data;
     },
@@ -54,6 +58,14 @@ export const api = {
         return (await axiosInstance.get('/history')).data;
     },
 
+    getVersions: async () => {
+        return (await axiosInstance.get('/versions')).data;
+    },
+
+    rollbackVersion: async (versionId: string) => {
+        return (await axiosInstance.post(`/versions/${versionId}/rollback`)).data;
+    },
+
     clearData: async () => {
         return (await axiosInstance.post('/clear-data')).data;
     },
@@ -62,6 +74,10 @@ export const api = {
         return (await axiosInstance.get('/notifications')).data;
     },
 
+    pollNotifications: async (since: number) => {
+        return (await axiosInstance.get('/notifications/poll', { params: { since, timeout: 25 }, timeout: 35000 })).data;
+    },
+
     markNotificationsRead: async () => {
         return (await axiosInstance.post('/notifications/read')).data;
     },